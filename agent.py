@@ -1,14 +1,25 @@
 from langgraph.graph import StateGraph, END, START
-from shared_store import url_time
+import asyncio
+from shared_store import get_session
+from checkpointer import CHECKPOINTER
+from metrics import METRICS_CALLBACK
+from rate_limiter import QuotaRateLimiter, RateLimitFeedback, LLM_DEADLINE, LLM_PROMPT_TOKENS
+from llm_cache import LLM_CACHE, CACHE_BYPASS, CACHE_URL
+from early_dispatch import STREAM_LLM, EarlyToolDispatcher, discard_early_calls, take_early_result
+from tool_repair import LOCAL_TOOL_REPAIR, TOOL_CALL_REPAIRS, repair_tool_calls
+from model_cascade import FAST_MODEL, STRONG_MODEL, escalate, escalation_reason
+from compaction import fold_messages, render_summary, split_for_compaction
 import time
-from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.prebuilt import ToolNode
 from tools import (
-    get_rendered_html, download_file, post_request,
+    get_rendered_html, get_raw_html, download_file, post_request,
     run_code, add_dependencies, ocr_image_tool, transcribe_audio, encode_image_to_base64
 )
+from tools.web_scraper import drop_prefetched
 from typing import TypedDict, Annotated, List
-from langchain_core.messages import trim_messages, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langchain_core.messages import trim_messages, HumanMessage, RemoveMessage
 from langchain.chat_models import init_chat_model
 from langgraph.graph.message import add_messages
 import os
@@ -20,6 +31,8 @@ SECRET = os.getenv("SECRET")
 
 RECURSION_LIMIT = 5000
 MAX_TOKENS = 60000
+COMPACT_AT_TOKENS = 45000    # fold old turns into the summary above this
+COMPACT_KEEP_TOKENS = 15000  # recent turns kept verbatim after compaction
 
 
 # -------------------------------------------------
@@ -27,10 +40,14 @@ MAX_TOKENS = 60000
 # -------------------------------------------------
 class AgentState(TypedDict):
     messages: Annotated[List, add_messages]
+    job_id: str  # key into shared_store.SESSIONS, injected into tools
+    summary: dict  # running summary of compacted turns (see compaction.py)
+    deadline: dict  # Deadline.to_dict() for the current quiz URL, injected into tools
+    escalation: dict  # set while the current quiz URL is handled by STRONG_MODEL
 
 
 TOOLS = [
-    run_code, get_rendered_html, download_file,
+    run_code, get_rendered_html, get_raw_html, download_file,
     post_request, add_dependencies, ocr_image_tool, transcribe_audio, encode_image_to_base64
 ]
 
@@ -38,17 +55,30 @@ TOOLS = [
 # -------------------------------------------------
 # LLM INIT
 # -------------------------------------------------
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=4 / 60,
-    check_every_n_seconds=1,
-    max_bucket_size=4
-)
-
-llm = init_chat_model(
-    model_provider="google_genai",
-    model="gemini-2.5-flash",
-    rate_limiter=rate_limiter
-).bind_tools(TOOLS)
+# RPM/TPM budgets come from GEMINI_RPM / GEMINI_TPM and are shared by every
+# job (and every worker process when a job store is configured).
+rate_limiter = QuotaRateLimiter()
+rate_limit_feedback = RateLimitFeedback(rate_limiter)
+
+# Identical prompts (same messages and tools) are answered from LLM_CACHE.
+def make_llm(model: str):
+    return init_chat_model(
+        model_provider="google_genai",
+        model=model,
+        rate_limiter=rate_limiter,
+        cache=LLM_CACHE,
+        # Streams internally (ainvoke still returns the whole message), so
+        # EarlyToolDispatcher sees tool calls as they are generated.
+        streaming=STREAM_LLM,
+    ).bind_tools(TOOLS)
+
+
+# Model cascade (see model_cascade.py): the fast model handles routine turns,
+# the strong one takes over a quiz URL after a wrong answer, a malformed
+# tool call or repeated tool errors.
+strong_llm = make_llm(STRONG_MODEL)
+fast_llm = make_llm(FAST_MODEL) if FAST_MODEL != STRONG_MODEL else strong_llm
+llm = fast_llm
 
 
 # -------------------------------------------------
@@ -76,17 +106,37 @@ Rules:
     secret = {SECRET}
 """
 
+FAST_SUBMIT_INSTRUCTION = """
+Only about {seconds} seconds are left for the quiz at {url}.
+Stop exploring. Call `post_request` NOW with your best answer so far; do not
+render pages, download files or run code first.
+"""
+
 
 # -------------------------------------------------
 # NEW NODE: HANDLE MALFORMED JSON
 # -------------------------------------------------
 def handle_malformed_node(state: AgentState):
     """
-    If the LLM generates invalid JSON, this node sends a correction message
-    so the LLM can try again.
+    If the LLM generates invalid JSON, first try to recover the call locally
+    (tool_repair.py). Otherwise send a correction message so the LLM can try
+    again, this time with the strong model.
     """
+    last = state["messages"][-1]
+    repaired = repair_tool_calls(last, tool_node.tools_by_name) if LOCAL_TOOL_REPAIR else None
+    if repaired is not None:
+        TOOL_CALL_REPAIRS.inc(outcome="local")
+        print("--- REPAIRED MALFORMED TOOL CALL LOCALLY ---")
+        return {"messages": [repaired]}
+    TOOL_CALL_REPAIRS.inc(outcome="llm_retry")
+
     print("--- DETECTED MALFORMED JSON. ASKING AGENT TO RETRY ---")
+    session = get_session(state["job_id"])
+    escalation = state.get("escalation") or {}
+    if escalation.get("url") != session.url and fast_llm is not strong_llm:
+        escalation = escalate(session, "malformed_call")
     return {
+        "escalation": escalation,
         "messages": [
             {
                 "role": "user", 
@@ -97,35 +147,89 @@ def handle_malformed_node(state: AgentState):
 
 
 # -------------------------------------------------
-# AGENT NODE
+# COMPACTION NODE
 # -------------------------------------------------
-def agent_node(state: AgentState):
-    # --- TIME HANDLING START ---
-    cur_time = time.time()
-    cur_url = os.getenv("url")
-    
-    # SAFE GET: Prevents crash if url is None or not in dict
-    prev_time = url_time.get(cur_url) 
-    offset = os.getenv("offset", "0")
+def needs_compaction(state: AgentState):
+    session = get_session(state["job_id"])
+    if session.tokens(state["messages"]) > COMPACT_AT_TOKENS:
+        return "compact"
+    return "agent"
+
+
+def compact_node(state: AgentState):
+    """
+    Fold everything but the system prompt and the most recent turns into
+    the structured summary, instead of letting trim_messages drop it.
+    """
+    session = get_session(state["job_id"])
+    messages = state["messages"]
+    cut = split_for_compaction(messages, session.tokens, COMPACT_KEEP_TOKENS)
+    folded = [m for m in messages[1:cut] if m.type != "system"]
+    if not folded:
+        return {}
+
+    summary = fold_messages(folded, state.get("summary"))
+    session.tokens.forget(m.id for m in folded)
+    print(f"--- COMPACTED {len(folded)} messages into the running summary ---")
+    return {
+        "messages": [RemoveMessage(id=m.id) for m in folded],
+        "summary": summary,
+    }
 
-    if prev_time is not None:
-        prev_time = float(prev_time)
-        diff = cur_time - prev_time
 
-        if diff >= 180 or (offset != "0" and (cur_time - float(offset)) > 90):
-            print(f"Timeout exceeded ({diff}s) — instructing LLM to purposely submit wrong answer.")
+def with_summary(messages: List, state: AgentState, session) -> List:
+    """
+    Put the compacted history right after the system prompt, so the
+    conversation still opens with a user turn.
+    """
+    if not state.get("summary"):
+        return messages
+    summary_msg = HumanMessage(content=render_summary(state["summary"], session.url))
+    at = 1 if messages and messages[0].type == "system" else 0
+    return messages[:at] + [summary_msg] + messages[at:]
 
-            fail_instruction = """
-            You have exceeded the time limit for this task (over 180 seconds).
-            Immediately call the `post_request` tool and submit a WRONG answer for the CURRENT quiz.
-            """
 
-            # Using HumanMessage (as you correctly implemented)
-            fail_msg = HumanMessage(content=fail_instruction)
+# -------------------------------------------------
+# AGENT NODE
+# -------------------------------------------------
+async def agent_node(state: AgentState, config: RunnableConfig):
+    session = get_session(state["job_id"])
+    # Anything started early during the previous call that never reached the tools node
+    discard_early_calls(session.early_calls)
 
-            # We invoke the LLM immediately with this new instruction
-            result = llm.invoke(state["messages"] + [fail_msg])
-            return {"messages": [result]}
+    # --- TIME HANDLING START ---
+    deadline = session.deadline()
+    updates = {"deadline": deadline.to_dict()} if deadline else {}
+    # Quizzes closest to their deadline get the next rate-limiter slot
+    LLM_DEADLINE.set(deadline.expires_at if deadline else float("inf"))
+    # A cached reply to a wrong answer would only be wrong again
+    CACHE_BYPASS.set(session.bypass_cache or bool(session.offset))
+    CACHE_URL.set(session.url)
+
+    # Escalations last until the agent moves on to the next quiz URL
+    escalation = state.get("escalation") or {}
+    if escalation.get("url") != session.url:
+        reason = escalation_reason(state["messages"], session)
+        escalation = escalate(session, reason) if reason and fast_llm is not strong_llm else {}
+    model = strong_llm if escalation else fast_llm
+    updates["escalation"] = escalation
+
+    if deadline is not None and deadline.expired():
+        print(f"Timeout exceeded ({deadline.elapsed():.0f}s) — instructing LLM to purposely submit wrong answer.")
+
+        fail_instruction = """
+        You have exceeded the time limit for this task (over 180 seconds).
+        Immediately call the `post_request` tool and submit a WRONG answer for the CURRENT quiz.
+        """
+
+        # Using HumanMessage (as you correctly implemented)
+        fail_msg = HumanMessage(content=fail_instruction)
+
+        # We invoke the LLM immediately with this new instruction
+        prompt = with_summary(state["messages"], state, session) + [fail_msg]
+        LLM_PROMPT_TOKENS.set(session.tokens(prompt))
+        result = await model.ainvoke(prompt)
+        return {"messages": [result], **updates}
     # --- TIME HANDLING END ---
 
     trimmed_messages = trim_messages(
@@ -133,28 +237,80 @@ def agent_node(state: AgentState):
         max_tokens=MAX_TOKENS,
         strategy="last",
         include_system=True,
-        start_on="human",
-        token_counter=llm, 
+        # After compaction the kept tail may open with an AI turn; the
+        # summary message supplies the leading user turn in that case.
+        start_on=("human", "ai") if state.get("summary") else "human",
+        token_counter=session.tokens,
     )
+    trimmed_messages = with_summary(trimmed_messages, state, session)
     
     # Better check: Does it have a HumanMessage?
     has_human = any(msg.type == "human" for msg in trimmed_messages)
     
     if not has_human:
         print("WARNING: Context was trimmed too far. Injecting state reminder.")
-        # We remind the agent of the current URL from the environment
-        current_url = os.getenv("url", "Unknown URL")
+        # We remind the agent of the current URL from the session
+        current_url = session.url or "Unknown URL"
         reminder = HumanMessage(content=f"Context cleared due to length. Continue processing URL: {current_url}")
         
         # We append this to the trimmed list (temporarily for this invoke)
         trimmed_messages.append(reminder)
     # ----------------------------------------
 
+    if deadline is not None and deadline.urgent():
+        # Not enough time left to keep exploring: answer with what we have.
+        print(f"Only {deadline.remaining():.0f}s left — asking LLM to submit now.")
+        trimmed_messages.append(HumanMessage(content=FAST_SUBMIT_INSTRUCTION.format(
+            seconds=int(deadline.remaining()), url=session.url
+        )))
+
     print(f"--- INVOKING AGENT (Context: {len(trimmed_messages)} items) ---")
     
-    result = llm.invoke(trimmed_messages)
+    LLM_PROMPT_TOKENS.set(session.tokens(trimmed_messages))
+    call_config = None
+    if STREAM_LLM:
+        dispatcher = EarlyToolDispatcher(
+            tool_node.tools_by_name,
+            {"job_id": state["job_id"], "deadline": updates.get("deadline")},
+            config,
+            session.early_calls,
+        )
+        call_config = merge_configs(config, {"callbacks": [dispatcher]})
+    result = await model.ainvoke(trimmed_messages, config=call_config)
+    session.tokens.calibrate(trimmed_messages, getattr(result, "usage_metadata", None))
+
+    return {"messages": [result], **updates}
+
 
-    return {"messages": [result]}
+# -------------------------------------------------
+# TOOLS NODE
+# -------------------------------------------------
+tool_node = ToolNode(TOOLS)
+
+
+async def tools_node(state: AgentState, config: RunnableConfig):
+    """
+    Run the last turn's tool calls. Calls EarlyToolDispatcher already
+    started while the model was streaming are awaited, not run again.
+    """
+    session = get_session(state["job_id"])
+    last = state["messages"][-1]
+    started = {}
+    for call in last.tool_calls:
+        task = take_early_result(session.early_calls, call)
+        if task is not None:
+            started[call["id"]] = task
+    discard_early_calls(session.early_calls)
+
+    results = {}
+    remaining = [call for call in last.tool_calls if call["id"] not in started]
+    if remaining:
+        rest = last.model_copy(update={"tool_calls": remaining})
+        output = await tool_node.ainvoke({**state, "messages": state["messages"][:-1] + [rest]}, config)
+        results.update((msg.tool_call_id, msg) for msg in output["messages"])
+    for call_id, task in started.items():
+        results[call_id] = await task
+    return {"messages": [results[call["id"]] for call in last.tool_calls if call["id"] in results]}
 
 
 # -------------------------------------------------
@@ -167,6 +323,8 @@ def route(state):
     if "finish_reason" in last.response_metadata:
         if last.response_metadata["finish_reason"] == "MALFORMED_FUNCTION_CALL":
             return "handle_malformed"
+    if getattr(last, "invalid_tool_calls", None) and not getattr(last, "tool_calls", None):
+        return "handle_malformed"
 
     # 2. CHECK FOR VALID TOOLS
     tool_calls = getattr(last, "tool_calls", None)
@@ -187,6 +345,14 @@ def route(state):
     return "agent"
 
 
+def after_repair(state):
+    """Run a locally repaired call straight away; otherwise go back to the model."""
+    if getattr(state["messages"][-1], "tool_calls", None):
+        print("Route → tools (repaired)")
+        return "tools"
+    return "agent"
+
+
 # -------------------------------------------------
 # GRAPH
 # -------------------------------------------------
@@ -194,13 +360,15 @@ graph = StateGraph(AgentState)
 
 # Add Nodes
 graph.add_node("agent", agent_node)
-graph.add_node("tools", ToolNode(TOOLS))
+graph.add_node("tools", tools_node)
 graph.add_node("handle_malformed", handle_malformed_node) # Add the repair node
+graph.add_node("compact", compact_node)
 
 # Add Edges
 graph.add_edge(START, "agent")
-graph.add_edge("tools", "agent")
-graph.add_edge("handle_malformed", "agent") # Retry loop
+graph.add_conditional_edges("tools", needs_compaction, {"compact": "compact", "agent": "agent"})
+graph.add_edge("compact", "agent")
+graph.add_conditional_edges("handle_malformed", after_repair, {"tools": "tools", "agent": "agent"}) # Retry loop
 
 # Conditional Edges
 graph.add_conditional_edges(
@@ -214,22 +382,97 @@ graph.add_conditional_edges(
     }
 )
 
-app = graph.compile()
+# With a checkpointer every completed node is saved under thread_id=job_id,
+# so run_agent_async can continue an interrupted job instead of restarting it.
+app = graph.compile(checkpointer=CHECKPOINTER)
+
+
+# -------------------------------------------------
+# PROGRESS EVENTS
+# -------------------------------------------------
+def _preview(value, limit: int = 300) -> str:
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def publish_update(session, node: str, update: dict):
+    """Turn one graph node update into job progress events."""
+    session.steps += 1
+    session.publish("node", node=node, step=session.steps, url=session.url)
+
+    for msg in (update or {}).get("messages", []):
+        for call in getattr(msg, "tool_calls", None) or []:
+            session.publish("tool_call", tool=call["name"], args=_preview(call["args"]))
+        if getattr(msg, "type", None) == "tool":
+            session.publish(
+                "tool_result",
+                tool=msg.name,
+                status=getattr(msg, "status", "success"),
+                preview=_preview(msg.content),
+            )
 
 
 # -------------------------------------------------
 # RUNNER
 # -------------------------------------------------
-def run_agent(url: str):
+async def run_agent_async(url: str, job_id: str):
+    """
+    Run (or resume) one quiz chain. If the job has a checkpoint with work
+    left, e.g. after a restart, the graph continues from the last completed
+    node and `url` is ignored.
+    """
     # system message is seeded ONCE here
     initial_messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": url}
     ]
 
-    app.invoke(
-        {"messages": initial_messages},
-        config={"recursion_limit": RECURSION_LIMIT}
-    )
-
-    print("Tasks completed successfully!")
\ No newline at end of file
+    session = get_session(job_id)
+    deadline = session.deadline()
+    config = {
+        "recursion_limit": RECURSION_LIMIT,
+        "callbacks": [METRICS_CALLBACK, rate_limit_feedback],
+        "configurable": {"thread_id": job_id},
+    }
+    resumed = CHECKPOINTER is not None and bool((await app.aget_state(config)).next)
+    inputs = None if resumed else {
+        "messages": initial_messages, "job_id": job_id, "deadline": deadline.to_dict() if deadline else None
+    }
+    session.status = "running"
+    session.started_at = session.started_at or time.time()
+    session.publish("job", status="running", url=session.url if resumed else url, resumed=resumed)
+    if resumed:
+        print(f"[{job_id}] Resuming from checkpoint at {session.url}")
+
+    try:
+        async for chunk in app.astream(inputs, config=config, stream_mode="updates"):
+            for node, update in chunk.items():
+                publish_update(session, node, update)
+        session.status = "done"
+        print(f"[{job_id}] Tasks completed successfully!")
+    except asyncio.CancelledError:
+        # Shutdown / redeploy: keep the checkpoint so the next start resumes the job.
+        if CHECKPOINTER is not None:
+            session.status = "queued"
+        else:
+            session.status, session.error = "failed", "cancelled"
+        raise
+    except BaseException as e:
+        session.status = "failed"
+        session.error = str(e) or type(e).__name__
+        raise
+    finally:
+        discard_early_calls(session.early_calls)
+        drop_prefetched(session)
+        if session.finished:
+            session.finished_at = time.time()
+            # Up to MAX_FINISHED_SESSIONS are kept for /jobs; only their status is needed
+            session.release()
+            if CHECKPOINTER is not None:
+                await CHECKPOINTER.adelete_thread(job_id)
+        session.publish("job", status=session.status, error=session.error)
+
+
+def run_agent(url: str, job_id: str):
+    """Blocking entry point for scripts; the server uses run_agent_async."""
+    asyncio.run(run_agent_async(url, job_id))
\ No newline at end of file
@@ -0,0 +1,282 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from job_store import JOB_STORE_PATH
+
+# Graph checkpoints live next to the jobs they belong to, so a restarted
+# container can pick interrupted jobs up where they stopped.
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", JOB_STORE_PATH)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id     TEXT,
+    type          TEXT NOT NULL,
+    checkpoint    BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata      BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id       TEXT NOT NULL,
+    idx           INTEGER NOT NULL,
+    channel       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB,
+    task_path     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    LangGraph checkpoint saver backed by SQLite (thread_id = job id).
+
+    Channel values are stored once per version, so a step only writes the
+    channels it changed. Resuming needs nothing but the newest checkpoint,
+    so older ones (and blobs no longer referenced) are dropped as new ones
+    arrive.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- reads ----------
+    def _tuple(self, conn, thread_id: str, ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, blob, metadata_type, metadata = row
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, blob))
+        values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            found = conn.execute(
+                """SELECT type, value FROM checkpoint_blobs
+                   WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?""",
+                (thread_id, ns, channel, str(version)),
+            ).fetchone()
+            if found is not None and found[0] != "empty":
+                values[channel] = self.serde.loads_typed(found)
+        writes = conn.execute(
+            """SELECT task_id, channel, type, value FROM checkpoint_writes
+               WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?
+               ORDER BY task_path, task_id, idx""",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+
+        def config_for(cid):
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": cid}}
+
+        return CheckpointTuple(
+            config=config_for(checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config_for(parent_id) if parent_id else None,
+            pending_writes=[(task, ch, self.serde.loads_typed((t, v))) for task, ch, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        conn = self._conn()
+        columns = "checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+        if checkpoint_id := get_checkpoint_id(config):
+            row = conn.execute(
+                f"""SELECT {columns} FROM checkpoints
+                    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?""",
+                (thread_id, ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                f"""SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                    ORDER BY checkpoint_id DESC LIMIT 1""",
+                (thread_id, ns),
+            ).fetchone()
+        return self._tuple(conn, thread_id, ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        conn = self._conn()
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+
+        for thread_id, ns, *row in conn.execute(query, params).fetchall():
+            found = self._tuple(conn, thread_id, ns, row)
+            if filter and any(found.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield found
+
+    # ---------- writes ----------
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        saved = checkpoint.copy()
+        values = saved.pop("channel_values")
+        type_, blob = self.serde.dumps_typed(saved)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (thread_id, ns, channel, str(version),
+                     *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)))
+                    for channel, version in new_versions.items()
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], parent_id, type_, blob, metadata_type, metadata_blob),
+            )
+            self._drop_history(conn, thread_id, ns, keep=(checkpoint["id"], parent_id))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def _drop_history(self, conn, thread_id: str, ns: str, keep: Tuple[str, Optional[str]]):
+        """Delete all but the newest checkpoint and its parent, plus orphaned blobs."""
+        kept = [cid for cid in keep if cid]
+        marks = ", ".join("?" * len(kept))
+        for table in ("checkpoints", "checkpoint_writes"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({marks})",
+                (thread_id, ns, *kept),
+            )
+        referenced = set()
+        for type_, blob in conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, ns)
+        ):
+            versions = self.serde.loads_typed((type_, blob))["channel_versions"]
+            referenced.update((channel, str(version)) for channel, version in versions.items())
+        stored = conn.execute(
+            "SELECT channel, version FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, ns),
+        ).fetchall()
+        conn.executemany(
+            "DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(thread_id, ns, channel, version) for channel, version in stored if (channel, version) not in referenced],
+        )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            rows.append((
+                thread_id, ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                channel, *self.serde.dumps_typed(value), task_path,
+            ))
+        conn = self._conn()
+        with conn:
+            # Special writes (errors, interrupts) replace; regular ones are written once.
+            conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] < 0],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] >= 0],
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        conn = self._conn()
+        with conn:
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # ---------- async API ----------
+    # Writes serialize the whole message history and may wait on another
+    # worker's lock, so they run in a thread instead of on the shared loop.
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs) -> AsyncIterator[CheckpointTuple]:
+        for item in await asyncio.to_thread(lambda: list(self.list(config, **kwargs))):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+CHECKPOINTER: Optional[SqliteCheckpointSaver] = SqliteCheckpointSaver(CHECKPOINT_PATH) if CHECKPOINT_PATH else None
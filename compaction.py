@@ -0,0 +1,124 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+MAX_ITEMS = 30        # per summary list; oldest entries fall off first
+EXCERPT_CHARS = 600   # how much of a page / program output survives compaction
+
+
+def _short(value: Any, limit: int = 200) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _parse(content: Any) -> Any:
+    if isinstance(content, str):
+        try:
+            return json.loads(content)
+        except ValueError:
+            return content
+    return content
+
+
+def _append(summary: Dict[str, list], key: str, item: Any):
+    items = summary.setdefault(key, [])
+    if item not in items:
+        items.append(item)
+    del items[:-MAX_ITEMS]
+
+
+def empty_summary() -> Dict[str, list]:
+    return {
+        "urls_visited": [],
+        "files_downloaded": [],
+        "answers_submitted": [],
+        "endpoints": [],
+        "page_excerpts": [],
+        "findings": [],
+    }
+
+
+def fold_messages(messages: List, summary: Dict[str, list]) -> Dict[str, list]:
+    """
+    Fold old turns into the structured running summary.
+
+    Tool calls say what was done (pages rendered, files downloaded, answers
+    posted) and the matching tool results say what came back, so the agent
+    can keep going without re-rendering or re-downloading anything.
+    """
+    summary = {key: list(value) for key, value in (summary or empty_summary()).items()}
+    calls: Dict[str, Tuple[str, dict]] = {}
+
+    for msg in messages:
+        for call in getattr(msg, "tool_calls", None) or []:
+            name, args = call["name"], call.get("args", {})
+            calls[call.get("id")] = (name, args)
+            if name == "get_rendered_html":
+                _append(summary, "urls_visited", args.get("url"))
+            elif name == "download_file":
+                _append(summary, "files_downloaded", f"{args.get('filename')} <- {args.get('url')}")
+            elif name == "post_request":
+                _append(summary, "endpoints", args.get("url"))
+
+        if getattr(msg, "type", None) != "tool":
+            continue
+        name, args = calls.get(getattr(msg, "tool_call_id", None), (getattr(msg, "name", ""), {}))
+        result = _parse(msg.content)
+        if name == "post_request":
+            payload = args.get("payload") or {}
+            outcome = result if isinstance(result, dict) else {"response": _short(result)}
+            _append(summary, "answers_submitted", {
+                "quiz": payload.get("url"),
+                "answer": _short(payload.get("answer"), 100),
+                "correct": outcome.get("correct"),
+                "next_url": outcome.get("url"),
+                "reason": _short(outcome.get("reason") or outcome.get("message") or "", 200),
+            })
+        elif name == "get_rendered_html" and isinstance(result, dict):
+            page = result.get("text") or result.get("html") or result.get("error") or ""
+            _append(summary, "page_excerpts", {
+                "url": args.get("url") or result.get("url"),
+                "excerpt": _short(page, EXCERPT_CHARS),
+            })
+        elif name == "run_code":
+            output = result.get("stdout") or result.get("stderr") if isinstance(result, dict) else result
+            _append(summary, "findings", f"run_code -> {_short(output, EXCERPT_CHARS)}")
+        elif name:
+            _append(summary, "findings", f"{name} -> {_short(result)}")
+
+    return summary
+
+
+def render_summary(summary: Dict[str, list], current_url: str) -> str:
+    lines = [
+        "Earlier turns were compacted into this summary. Do not redo work listed here.",
+        f"Current quiz URL: {current_url}",
+    ]
+    for key, items in summary.items():
+        if items:
+            lines.append(f"{key.replace('_', ' ').capitalize()}:")
+            lines.extend(f"- {_short(item, EXCERPT_CHARS + 200)}" for item in items)
+    return "\n".join(lines)
+
+
+def split_for_compaction(messages: List, counter, keep_tokens: int) -> int:
+    """
+    Return the index where the kept tail starts.
+
+    Messages before it (after the system prompt) get folded. The latest AI
+    turn and its tool results are always kept, since the model has not seen
+    those results yet. The cut never lands on a tool result; it moves back to
+    the AI message that made the call, so no kept ToolMessage loses its call.
+    """
+    kept = 0
+    cut = len(messages)
+    while cut > 1:
+        size = counter([messages[cut - 1]])
+        if kept + size > keep_tokens:
+            break
+        kept += size
+        cut -= 1
+    last_ai = max((i for i, m in enumerate(messages) if getattr(m, "type", None) == "ai"), default=len(messages))
+    cut = min(cut, last_ai)
+    while 1 < cut < len(messages) and getattr(messages[cut], "type", None) == "tool":
+        cut -= 1
+    return cut
@@ -0,0 +1,68 @@
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+QUIZ_TIME_LIMIT = 180.0    # seconds the quiz server allows per URL
+RETRY_WINDOW = 90.0        # extra time we allow ourselves for retrying a wrong answer
+# Below this many seconds the agent stops working and submits what it has.
+SAFETY_MARGIN = float(os.getenv("DEADLINE_SAFETY_MARGIN", "25"))
+# Used when a tool is called outside the graph (warm-up, scripts).
+DEFAULT_TOOL_TIMEOUT = 60.0
+
+
+@dataclass
+class Deadline:
+    """
+    Time budget for the quiz URL a job is currently working on.
+
+    `started_at` is when the URL was first reached; `retry_started_at` is
+    set while re-attempting a wrong answer, which closes the budget after
+    RETRY_WINDOW seconds even if the overall limit has not been reached.
+    A snapshot is written into the graph state by agent_node on every step
+    and injected into tools, which use it for their timeouts.
+    """
+    started_at: float
+    retry_started_at: float = 0.0
+    limit: float = QUIZ_TIME_LIMIT
+    retry_limit: float = RETRY_WINDOW
+
+    @property
+    def expires_at(self) -> float:
+        expires = self.started_at + self.limit
+        if self.retry_started_at:
+            expires = min(expires, self.retry_started_at + self.retry_limit)
+        return expires
+
+    def elapsed(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.started_at
+
+    def remaining(self, now: Optional[float] = None) -> float:
+        return self.expires_at - (now or time.time())
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.remaining(now) <= 0
+
+    def urgent(self, now: Optional[float] = None) -> bool:
+        """True once less than SAFETY_MARGIN is left: time to submit."""
+        return self.remaining(now) < SAFETY_MARGIN
+
+    def timeout(self, floor: float = 1.0, cap: Optional[float] = None) -> float:
+        """Remaining budget as a timeout, clamped to [floor, cap]."""
+        seconds = max(floor, self.remaining())
+        return min(seconds, cap) if cap is not None else seconds
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional["Deadline"]:
+        return cls(**data) if data else None
+
+
+def tool_timeout(deadline: Optional[dict], floor: float = 1.0, cap: Optional[float] = None) -> float:
+    """Timeout for a tool given the (injected) deadline from graph state."""
+    parsed = Deadline.from_dict(deadline)
+    if parsed is None:
+        return min(DEFAULT_TOOL_TIMEOUT, cap) if cap is not None else DEFAULT_TOOL_TIMEOUT
+    return parsed.timeout(floor=floor, cap=cap)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessageChunk, ToolMessage
+
+from metrics import Counter, Histogram
+
+# Stream Gemini's reply and start read-only tools as soon as their arguments
+# are complete, instead of after the whole turn has been generated.
+STREAM_LLM = os.getenv("STREAM_LLM", "1") == "1"
+# Safe to run before the turn is final: read-only, so a call that is
+# cancelled or discarded leaves nothing behind (download_file writes into the
+# workdir and is not one of them).
+EARLY_TOOLS = ("get_rendered_html", "get_raw_html")
+
+EARLY_DISPATCHES = Counter(
+    "quiz_early_tool_dispatches_total", "Tool calls started while the model was still streaming, by outcome."
+)
+FIRST_ACTION_SECONDS = Histogram(
+    "quiz_time_to_first_action_seconds", "From the start of a streamed LLM call to its first early tool dispatch."
+)
+
+
+async def _run(tool, call: Dict[str, Any], config) -> ToolMessage:
+    """Invoke a tool like ToolNode does, turning exceptions into error results."""
+    try:
+        return await tool.ainvoke({**call, "type": "tool_call"}, config)
+    except Exception as e:
+        return ToolMessage(
+            content=f"Error: {e!r}\n Please fix your mistakes.",
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+        )
+
+
+class EarlyToolDispatcher(AsyncCallbackHandler):
+    """
+    Watches streamed chunks of one LLM call and starts EARLY_TOOLS calls
+    whose JSON arguments are complete.
+
+    Started calls are put in `pending` (the session's early_calls) keyed by
+    tool call id, as (args, task); the tools node awaits them instead of
+    running the call again.
+    """
+
+    run_inline = True
+
+    def __init__(self, tools_by_name: Dict[str, Any], injected: Dict[str, Any], config, pending: Dict[str, Tuple[dict, asyncio.Task]]):
+        self.tools_by_name = tools_by_name
+        self.injected = injected
+        self.config = config
+        self.pending = pending
+        self.message: Optional[AIMessageChunk] = None
+        self.started_at = time.perf_counter()
+        self.dispatched = 0
+
+    async def on_llm_new_token(self, token, *, chunk=None, **kwargs):
+        message = getattr(chunk, "message", None)
+        if not isinstance(message, AIMessageChunk):
+            return
+        self.message = message if self.message is None else self.message + message
+
+        for call in self.message.tool_call_chunks:
+            call_id, name = call.get("id"), call.get("name")
+            if not call_id or call_id in self.pending or name not in EARLY_TOOLS:
+                continue
+            try:
+                args = json.loads(call.get("args") or "")
+            except ValueError:
+                continue  # still streaming
+            tool = self.tools_by_name[name]
+            # Injected parameters (job_id, deadline) are named after their state keys
+            hidden = {
+                arg: self.injected.get(arg)
+                for arg in tool.get_input_schema().model_fields if arg not in tool.tool_call_schema.model_fields
+            }
+            task = asyncio.create_task(_run(tool, {"name": name, "args": {**args, **hidden}, "id": call_id}, self.config))
+            self.pending[call_id] = (args, task)
+            self.dispatched += 1
+            if self.dispatched == 1:
+                FIRST_ACTION_SECONDS.observe(time.perf_counter() - self.started_at)
+            print(f"--- EARLY DISPATCH: {name} while the model is still streaming ---")
+
+
+def take_early_result(pending: Dict[str, Tuple[dict, asyncio.Task]], call: Dict[str, Any]) -> Optional[asyncio.Task]:
+    """Task for a final tool call that was already started with the same arguments."""
+    entry = pending.pop(call["id"], None)
+    if entry is None:
+        return None
+    args, task = entry
+    if args != call["args"]:
+        task.cancel()
+        EARLY_DISPATCHES.inc(outcome="discarded")
+        return None
+    EARLY_DISPATCHES.inc(outcome="used")
+    return task
+
+
+def discard_early_calls(pending: Dict[str, Tuple[dict, asyncio.Task]]):
+    """Cancel started calls that did not make it into a final tool turn."""
+    for _, task in pending.values():
+        task.cancel()
+        EARLY_DISPATCHES.inc(outcome="discarded")
+    pending.clear()
@@ -0,0 +1,59 @@
+"""
+Per-module import-time report.
+
+Runs a fresh interpreter with `-X importtime`, so the numbers match a real
+cold start, and prints the slowest modules by cumulative time:
+
+    python import_report.py                 # profile `import main`
+    python import_report.py agent --top 40
+    python import_report.py main --budget-ms 3000   # exit 1 if slower
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+
+def measure(module: str = "main") -> List[Tuple[str, float, float]]:
+    """Return (module, self_ms, cumulative_ms) for everything `import module` loads."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if the total import time exceeds this")
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    total = next((cum for name, _, cum in reversed(rows) if name == args.module), 0.0)
+
+    print(f"{'cumulative ms':>14} {'self ms':>10}  module")
+    for name, self_ms, cumulative_ms in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_ms:14.1f} {self_ms:10.1f}  {name}")
+    print(f"\nimport {args.module}: {total:.1f} ms total, {len(rows)} modules")
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"Import time {total:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
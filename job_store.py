@@ -0,0 +1,265 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Set JOB_STORE_PATH (or run with WORKERS > 1) to share jobs between processes.
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH") or ("jobs.db" if int(os.getenv("WORKERS", "1")) > 1 else "")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    url         TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    "offset"    REAL NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    steps       INTEGER NOT NULL DEFAULT 0,
+    last_result TEXT,
+    error       TEXT,
+    owner_pid   INTEGER,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    job_id     TEXT NOT NULL,
+    url        TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, url)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    job_id TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    value  TEXT NOT NULL,
+    PRIMARY KEY (job_id, key)
+);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    id     INTEGER NOT NULL,
+    body   TEXT NOT NULL,
+    PRIMARY KEY (job_id, id)
+);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed copy of every Session, shared by all worker processes.
+
+    The worker running a job keeps its Session in memory and writes through
+    on each progress event. Other workers read from here to answer
+    /jobs/{id} and to stream events for jobs they do not own.
+
+    Writes are queued to one background thread per process and committed
+    in order, so the event loop never waits on the SQLite lock (which may
+    be held by another worker, the rate limiter or the checkpointer).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "updated_at" not in columns:  # job stores created before resumable jobs
+                conn.execute("ALTER TABLE jobs ADD COLUMN updated_at REAL")
+        self._writes: "queue.Queue" = queue.Queue()
+        threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # ---------- background writes ----------
+    def _write_loop(self):
+        while True:
+            func, args = self._writes.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"Job store write failed: {e!r}")
+            finally:
+                self._writes.task_done()
+
+    def _enqueue(self, func, *args):
+        self._writes.put((func, args))
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        self._writes.join()
+
+    # ---------- sessions ----------
+    def save(self, session):
+        # Snapshot the fields now; the session keeps changing while the write waits.
+        job = (
+            session.job_id, session.url, session.status, session.offset,
+            session.created_at, session.started_at, session.finished_at,
+            session.steps, json.dumps(session.last_result), session.error, os.getpid(),
+            time.time(),
+        )
+        urls = [
+            (session.job_id, url, first_seen, session.attempts.get(url, 0))
+            for url, first_seen in session.url_time.items()
+        ]
+        self._enqueue(self._save, job, urls)
+
+    def _save(self, job: tuple, urls: List[tuple]):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """INSERT INTO jobs (job_id, url, status, "offset", created_at, started_at,
+                                     finished_at, steps, last_result, error, owner_pid, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(job_id) DO UPDATE SET
+                     url=excluded.url, status=excluded.status, "offset"=excluded."offset",
+                     started_at=excluded.started_at, finished_at=excluded.finished_at,
+                     steps=excluded.steps, last_result=excluded.last_result,
+                     error=excluded.error, owner_pid=excluded.owner_pid,
+                     updated_at=excluded.updated_at""",
+                job,
+            )
+            conn.executemany(
+                """INSERT INTO urls (job_id, url, first_seen, attempts) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(job_id, url) DO UPDATE SET attempts=excluded.attempts""",
+                urls,
+            )
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored fields of a job, or None if it is unknown."""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        fields = dict(row)
+        fields["last_result"] = json.loads(fields["last_result"] or "null")
+        urls = conn.execute("SELECT url, first_seen, attempts FROM urls WHERE job_id = ?", (job_id,))
+        fields["url_time"], fields["attempts"] = {}, {}
+        for url, first_seen, attempts in urls:
+            fields["url_time"][url] = first_seen
+            fields["attempts"][url] = attempts
+        last = conn.execute("SELECT MAX(id) FROM events WHERE job_id = ?", (job_id,)).fetchone()[0]
+        fields["last_event_id"] = last or 0
+        return fields
+
+    def delete(self, job_id: str):
+        self._enqueue(self._delete, job_id)
+
+    def _delete(self, job_id: str):
+        conn = self._conn()
+        with conn:
+            for table in ("jobs", "urls", "blobs", "events"):
+                conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+    def claim_interrupted(self, started_before: float) -> List[str]:
+        """
+        Take over unfinished jobs left behind by a process that is gone.
+
+        A job qualifies if it was last written before `started_before` (this
+        process's start) and its owner pid is either dead or our own (pids
+        are reused after a container restart). Each job is claimed by
+        exactly one worker.
+        """
+        conn = self._conn()
+        stale = conn.execute(
+            """SELECT job_id, updated_at, owner_pid FROM jobs
+               WHERE status IN ('queued', 'running') AND COALESCE(updated_at, 0) < ?
+               ORDER BY created_at""",
+            (started_before,),
+        ).fetchall()
+        claimed = []
+        for job_id, updated_at, owner_pid in stale:
+            if owner_pid != os.getpid() and _alive(owner_pid):
+                continue
+            with conn:
+                cursor = conn.execute(
+                    """UPDATE jobs SET owner_pid = ?, updated_at = ?
+                       WHERE job_id = ? AND updated_at IS ?""",
+                    (os.getpid(), time.time(), job_id, updated_at),
+                )
+            if cursor.rowcount == 1:
+                claimed.append(job_id)
+        return claimed
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def prune(self, keep_finished: int):
+        """Drop all but the newest `keep_finished` finished jobs."""
+        self._enqueue(self._prune, keep_finished)
+
+    def _prune(self, keep_finished: int):
+        conn = self._conn()
+        stale = [
+            row[0] for row in conn.execute(
+                """SELECT job_id FROM jobs WHERE status IN ('done', 'failed')
+                   ORDER BY finished_at DESC LIMIT -1 OFFSET ?""",
+                (keep_finished,),
+            )
+        ]
+        for job_id in stale:
+            self._delete(job_id)
+
+    # ---------- blobs ----------
+    def put_blob(self, job_id: str, key: str, value: str):
+        self._enqueue(self._put_blob, job_id, key, value)
+
+    def _put_blob(self, job_id: str, key: str, value: str):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (job_id, key, value) VALUES (?, ?, ?)",
+                (job_id, key, value),
+            )
+
+    def get_blob(self, job_id: str, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM blobs WHERE job_id = ? AND key = ?", (job_id, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    # ---------- events ----------
+    def append_event(self, job_id: str, event: Dict[str, Any]):
+        self._enqueue(self._append_event, job_id, event["id"], json.dumps(event, default=str))
+
+    def _append_event(self, job_id: str, event_id: int, body: str):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO events (job_id, id, body) VALUES (?, ?, ?)",
+                (job_id, event_id, body),
+            )
+
+    def events_after(self, job_id: str, last_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT body FROM events WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (job_id, last_id, limit),
+        )
+        return [json.loads(body) for (body,) in rows]
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+STORE: Optional[JobStore] = JobStore(JOB_STORE_PATH) if JOB_STORE_PATH else None
@@ -0,0 +1,153 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration
+
+from metrics import Counter
+
+# Exact-match cache of Gemini responses, so replayed quiz chains (evaluation
+# reruns, regression tests) skip the model. Off unless LLM_CACHE_PATH is set.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+# LLM_CACHE_BYPASS=1 stops lookups (answers are still stored, which refreshes them).
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+
+# Set by agent_node for a single job: the job asked for fresh answers, or it
+# is retrying a wrong one and replaying the cached reply would not help.
+CACHE_BYPASS: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+# Quiz URL the job was working on, stored with each reply so a wrong answer
+# can evict the replies that led to it.
+CACHE_URL: contextvars.ContextVar[str] = contextvars.ContextVar("llm_cache_url", default="")
+
+CACHE_LOOKUPS = Counter("quiz_llm_cache_lookups_total", "LLM response cache lookups, by result.")
+
+# Fields that differ between otherwise identical conversations.
+_VOLATILE_FIELDS = ("id", "tool_call_id", "usage_metadata", "response_metadata")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key       TEXT PRIMARY KEY,
+    value     TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    url       TEXT
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def _normalize(prompt: str) -> Any:
+    """Strip ids and provider metadata from a serialized message list."""
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    for message in messages if isinstance(messages, list) else []:
+        fields = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        for name in _VOLATILE_FIELDS:
+            fields.pop(name, None)
+        for call in fields.get("tool_calls") or []:
+            call.pop("id", None)
+    return messages
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Hash of the normalized messages plus the model config and bound tools."""
+    body = json.dumps(_normalize(prompt), sort_keys=True, default=str)
+    return hashlib.sha256(f"{body}\x00{llm_string}".encode()).hexdigest()
+
+
+class SqliteLLMCache(BaseCache):
+    """
+    LangChain cache backed by SQLite with least-recently-used eviction.
+
+    Entries are bounded by total size (LLM_CACHE_MAX_MB). A hit gets fresh
+    message and tool call ids, so the same reply can be added to a graph
+    state twice, and is marked with response_metadata["cache_hit"] so the
+    rate limiter and metrics do not count it as a Gemini call.
+
+    Each reply is tagged with the quiz URL it was generated for (CACHE_URL);
+    evict_url() drops them once that URL gets a wrong answer.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(responses)")}
+        if "url" not in columns:  # caches created before wrong answers were evicted
+            conn.execute("ALTER TABLE responses ADD COLUMN url TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_url ON responses (url)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list]:
+        if LLM_CACHE_BYPASS or CACHE_BYPASS.get():
+            CACHE_LOOKUPS.inc(result="bypass")
+            return None
+        key = cache_key(prompt, llm_string)
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        CACHE_LOOKUPS.inc(result="hit")
+        print(f"--- LLM CACHE HIT ({key[:12]}) ---")
+
+        generations = []
+        for message in messages_from_dict(json.loads(row[0])):
+            message.id = None  # the model assigns a new run id
+            for call in getattr(message, "tool_calls", None) or []:
+                call["id"] = str(uuid.uuid4())
+            message.response_metadata = {**message.response_metadata, "cache_hit": True}
+            generations.append(ChatGeneration(message=message))
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: list) -> None:
+        messages = [g.message for g in return_val if isinstance(g, ChatGeneration)]
+        if not messages:
+            return
+        value = json.dumps(messages_to_dict(messages), default=str)
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, last_used, url) VALUES (?, ?, ?, ?, ?)",
+            (cache_key(prompt, llm_string), value, len(value), time.time(), CACHE_URL.get() or None),
+        )
+        self._evict(conn)
+
+    def evict_url(self, url: str) -> int:
+        """Drop every reply generated while solving `url`; returns how many."""
+        return self._conn().execute("DELETE FROM responses WHERE url = ?", (url,)).rowcount
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            row = conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            total -= row[1]
+
+    def clear(self, **kwargs: Any) -> None:
+        self._conn().execute("DELETE FROM responses")
+
+
+LLM_CACHE = SqliteLLMCache() if LLM_CACHE_PATH else None
@@ -1,12 +1,22 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from agent import run_agent
+from agent import run_agent_async
 from dotenv import load_dotenv
 import uvicorn
 import os
-from shared_store import url_time, BASE64_STORE
+from shared_store import create_session, drop_session, find_session, restore_session
+from checkpointer import CHECKPOINTER
+from job_store import STORE
+from scheduler import JobScheduler, QueueFull
+from tools.http_client import close_client
+from tools.browser_pool import close_browser
+from warmup import STATUS as WARMUP_STATUS, warm_up
+from metrics import JOBS, render_metrics
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import time
 
 load_dotenv()
@@ -14,7 +24,37 @@ load_dotenv()
 EMAIL = os.getenv("EMAIL") 
 SECRET = os.getenv("SECRET")
 
-app = FastAPI()
+scheduler = JobScheduler(run_agent_async)
+
+
+def resume_interrupted_jobs():
+    """Requeue jobs a previous process left unfinished; they continue from their checkpoint."""
+    if STORE is None or CHECKPOINTER is None:
+        return
+    for job_id in STORE.claim_interrupted(START_TIME):
+        session = restore_session(job_id)
+        try:
+            scheduler.submit(session.url, job_id)
+            print(f"Resuming interrupted job {job_id} at {session.url}")
+        except QueueFull:
+            session.status, session.error = "failed", "not resumed: queue full"
+            session.publish("job", status=session.status, error=session.error)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await scheduler.start()
+    resume_interrupted_jobs()
+    # Warm up in the background so /healthz answers while /readyz says no.
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+    await scheduler.stop()
+    await close_client()
+    await close_browser()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specific domains
@@ -31,8 +71,76 @@ def healthz():
         "uptime_seconds": int(time.time() - START_TIME)
     }
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of node, tool, LLM and submission metrics."""
+    stats = scheduler.stats()
+    JOBS.set(stats["running"], state="running")
+    JOBS.set(stats["queued"], state="queued")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/queue")
+def queue():
+    """Scheduler capacity and queue depth, for sizing containers."""
+    stats = scheduler.stats()
+    stats["pid"] = os.getpid()
+    if STORE is not None:
+        # Totals across every worker process sharing the job store.
+        stats["all_workers"] = STORE.count_by_status()
+    return stats
+
+@app.get("/readyz")
+def readyz():
+    """Readiness check: false until the warm-up phase has finished."""
+    return JSONResponse(status_code=200 if WARMUP_STATUS["ready"] else 503, content=WARMUP_STATUS)
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Current URL, step count, quiz clock and last answer for one job."""
+    session = find_session(job_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return session.snapshot()
+
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job's node transitions, tool calls and
+    submissions. Reconnecting clients may send Last-Event-ID to resume.
+    """
+    session = find_session(job_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    try:
+        last_id = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        last_id = 0
+
+    async def stream():
+        nonlocal last_id
+        while True:
+            for event in session.events_after(last_id):
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+            if session.finished or await request.is_disconnected():
+                break
+            await session.wait_for_event(SSE_KEEPALIVE_SECONDS)
+            if not session.events_after(last_id):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/solve")
-async def solve(request: Request, background_tasks: BackgroundTasks):
+async def solve(request: Request):
     try:
         data = await request.json()
     except Exception:
@@ -46,16 +154,28 @@ async def solve(request: Request, background_tasks: BackgroundTasks):
     
     if secret != SECRET:
         raise HTTPException(status_code=403, detail="Invalid secret")
-    url_time.clear() 
-    BASE64_STORE.clear()  
-    print("Verified starting the task...")
-    os.environ["url"] = url
-    os.environ["offset"] = "0"
-    url_time[url] = time.time()
-    background_tasks.add_task(run_agent, url)
+    session = create_session(url, bypass_cache=bool(data.get("bypass_cache")))
+    try:
+        scheduler.submit(url, session.job_id)
+    except QueueFull as e:
+        drop_session(session.job_id)
+        print(f"Rejecting task, queue is full (retry after {e.retry_after}s)")
+        return JSONResponse(
+            status_code=429,
+            content={"status": "busy", "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    print(f"Verified starting the task... (job {session.job_id})")
+
+    return JSONResponse(status_code=200, content={"status": "ok", "job_id": session.job_id})
 
-    return JSONResponse(status_code=200, content={"status": "ok"})
 
+WORKERS = int(os.getenv("WORKERS", "1"))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=7860)
\ No newline at end of file
+    if WORKERS > 1:
+        # Each worker process gets its own scheduler and event loop; jobs,
+        # deadlines and retry counters are shared through the job store.
+        uvicorn.run("main:app", host="0.0.0.0", port=7860, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=7860)
\ No newline at end of file
@@ -0,0 +1,201 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Default buckets cover everything from a cached HTTP fetch to a full quiz.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180)
+TOKEN_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 20000, 40000, 60000, 100000)
+
+_lock = threading.Lock()
+_registry: List["_Metric"] = []
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Iterable[Tuple[str, str]], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# -------------------------------------------------
+# METRIC TYPES (Prometheus text exposition format)
+# -------------------------------------------------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with _lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    with _lock:
+        lines = [line for metric in _registry for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------------------------------
+# METRICS
+# -------------------------------------------------
+NODE_SECONDS = Histogram("quiz_node_duration_seconds", "Wall time of each LangGraph node run.")
+TOOL_SECONDS = Histogram("quiz_tool_duration_seconds", "Wall time of each tool call.")
+LLM_SECONDS = Histogram("quiz_llm_latency_seconds", "Latency of each chat model call.")
+LLM_INPUT_TOKENS = Histogram("quiz_llm_input_tokens", "Prompt tokens per chat model call.", TOKEN_BUCKETS)
+LLM_OUTPUT_TOKENS = Histogram("quiz_llm_output_tokens", "Completion tokens per chat model call.", TOKEN_BUCKETS)
+LLM_ERRORS = Counter("quiz_llm_errors_total", "Chat model calls that raised.")
+RATE_LIMIT_WAIT = Histogram("quiz_rate_limiter_wait_seconds", "Time spent waiting on the LLM rate limiter.")
+SUBMISSIONS = Counter("quiz_submissions_total", "Answers submitted by post_request, by result.")
+JOBS = Gauge("quiz_jobs", "Jobs in the scheduler, by state.")
+
+
+# -------------------------------------------------
+# LANGCHAIN CALLBACK
+# -------------------------------------------------
+class MetricsCallback(BaseCallbackHandler):
+    """
+    Times graph nodes, tools and chat model calls from LangChain callbacks.
+
+    A node run is the chain whose name equals its `langgraph_node` metadata;
+    anything nested inside it (routers, sub-runnables) is ignored.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[str, str, float]] = {}
+
+    def _start(self, run_id: UUID, kind: str, label: str):
+        self._started[run_id] = (kind, label, time.perf_counter())
+
+    def _finish(self, run_id: UUID, status: str = "ok"):
+        entry = self._started.pop(run_id, None)
+        if entry is None:
+            return None
+        kind, label, started = entry
+        elapsed = time.perf_counter() - started
+        if kind == "node":
+            NODE_SECONDS.observe(elapsed, node=label)
+        elif kind == "tool":
+            TOOL_SECONDS.observe(elapsed, tool=label, status=status)
+        elif kind == "llm":
+            LLM_SECONDS.observe(elapsed, model=label, status=status)
+        return label
+
+    # ---------- nodes ----------
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+    # ---------- tools ----------
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        self._start(run_id, "tool", name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        status = getattr(output, "status", "success")
+        self._finish(run_id, "ok" if status == "success" else "error")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+    # ---------- chat model ----------
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or "unknown"
+        self._start(run_id, "llm", model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model = self._finish(run_id)
+        if model is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage and not getattr(message, "response_metadata", {}).get("cache_hit"):
+                    LLM_INPUT_TOKENS.observe(usage.get("input_tokens", 0), model=model)
+                    LLM_OUTPUT_TOKENS.observe(usage.get("output_tokens", 0), model=model)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        model = self._finish(run_id, "error")
+        LLM_ERRORS.inc(model=model or "unknown")
+
+
+METRICS_CALLBACK = MetricsCallback()
@@ -0,0 +1,57 @@
+import json
+import os
+from typing import List, Optional
+
+from metrics import Counter
+
+# Routine turns go to FAST_MODEL; a quiz URL switches to STRONG_MODEL once
+# the fast model has visibly struggled with it. Set both to the same model
+# to disable the cascade.
+FAST_MODEL = os.getenv("FAST_MODEL", "gemini-2.5-flash-lite")
+STRONG_MODEL = os.getenv("STRONG_MODEL", "gemini-2.5-flash")
+# Consecutive failed tool results that count as "stuck".
+TOOL_ERROR_ESCALATION = int(os.getenv("TOOL_ERROR_ESCALATION", "2"))
+
+MODEL_ESCALATIONS = Counter("quiz_model_escalations_total", "Switches from the fast to the strong model, by reason.")
+
+
+def tool_failed(message) -> bool:
+    """Best-effort check whether a ToolMessage reports a failure."""
+    if getattr(message, "status", "success") == "error":
+        return True
+    content = message.content
+    if isinstance(content, str):
+        if content.startswith(("Error", "Unexpected error")):
+            return True
+        try:
+            content = json.loads(content)
+        except ValueError:
+            return False
+    if isinstance(content, dict):
+        return bool(content.get("error")) or content.get("return_code") not in (None, 0)
+    return False
+
+
+def escalation_reason(messages: List, session) -> Optional[str]:
+    """Why the current quiz URL needs the strong model, or None."""
+    if session.offset:
+        # post_request only opens a retry window after a wrong answer
+        return "wrong_answer"
+    failures = 0
+    for message in reversed(messages):
+        if message.type == "ai":
+            continue
+        if message.type != "tool" or not tool_failed(message):
+            break
+        failures += 1
+    if failures >= TOOL_ERROR_ESCALATION:
+        return "tool_errors"
+    return None
+
+
+def escalate(session, reason: str) -> dict:
+    """Record an escalation; the returned dict is kept in the graph state."""
+    MODEL_ESCALATIONS.inc(reason=reason)
+    print(f"--- ESCALATING to {STRONG_MODEL} ({reason}) for {session.url} ---")
+    session.publish("escalation", reason=reason, model=STRONG_MODEL, url=session.url)
+    return {"url": session.url, "reason": reason, "model": STRONG_MODEL}
@@ -0,0 +1,299 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from job_store import JOB_STORE_PATH
+from metrics import Counter, Gauge, RATE_LIMIT_WAIT
+
+# Defaults to the free-tier limit of gemini-2.5-flash; raise it on a paid key.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "250000"))
+# Shared with other worker processes when a file is configured.
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", JOB_STORE_PATH)
+WINDOW_SECONDS = 60.0
+DEFAULT_COOLDOWN = 10.0      # back-off after a 429 that carries no retry hint
+POLL_SECONDS = 0.25
+
+# Set by agent_node before each LLM call: the caller's deadline (epoch seconds,
+# earlier = more urgent) and its estimated prompt size.
+LLM_DEADLINE: contextvars.ContextVar[float] = contextvars.ContextVar("llm_deadline", default=float("inf"))
+LLM_PROMPT_TOKENS: contextvars.ContextVar[int] = contextvars.ContextVar("llm_prompt_tokens", default=0)
+# Tokens actually reserved by the acquire of the current LLM call, so the
+# feedback callback can book only the difference once usage is known. A
+# one-item list set by the callback when the call starts: the acquire runs
+# in a child task of the model's gather() and can only mutate it.
+_RESERVED_TOKENS: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("reserved_tokens", default=None)
+
+QUOTA_ERRORS = Counter("quiz_llm_quota_errors_total", "429 / RESOURCE_EXHAUSTED responses from the LLM.")
+EFFECTIVE_RPM = Gauge("quiz_llm_effective_rpm", "Request budget currently used by the adaptive limiter.")
+
+
+# -------------------------------------------------
+# SLIDING-WINDOW BACKENDS
+# -------------------------------------------------
+class MemoryWindow:
+    """Per-process 60 s log of (time, requests, tokens)."""
+
+    def __init__(self):
+        self._log = deque()
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def try_reserve(self, now: float, rpm: float, tpm: float, tokens: int) -> float:
+        """Reserve one request; return 0 on success or the seconds to wait."""
+        with self._lock:
+            while self._log and self._log[0][0] <= now - WINDOW_SECONDS:
+                self._log.popleft()
+            requests = sum(r for _, r, _ in self._log)
+            used = sum(t for _, _, t in self._log)
+            wait = _wait_needed(now, self._log, requests, used, rpm, tpm, tokens)
+            if wait == 0:
+                self._log.append((now, 1, tokens))
+            return wait
+
+    def add_tokens(self, now: float, tokens: int):
+        with self._lock:
+            self._log.append((now, 0, tokens))
+
+    def get(self, key: str, default: float) -> float:
+        return self._state.get(key, default)
+
+    def set(self, key: str, value: float):
+        self._state[key] = value
+
+
+class SqliteWindow:
+    """Same log in SQLite, so every worker process draws from one budget."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS llm_calls (t REAL NOT NULL, requests INTEGER NOT NULL, tokens INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS llm_calls_t ON llm_calls (t);
+            CREATE TABLE IF NOT EXISTS limiter_state (key TEXT PRIMARY KEY, value REAL NOT NULL);
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def try_reserve(self, now: float, rpm: float, tpm: float, tokens: int) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # serialises reservations across processes
+        try:
+            conn.execute("DELETE FROM llm_calls WHERE t <= ?", (now - WINDOW_SECONDS,))
+            log = conn.execute("SELECT t, requests, tokens FROM llm_calls ORDER BY t").fetchall()
+            requests = sum(r for _, r, _ in log)
+            used = sum(t for _, _, t in log)
+            wait = _wait_needed(now, log, requests, used, rpm, tpm, tokens)
+            if wait == 0:
+                conn.execute("INSERT INTO llm_calls VALUES (?, 1, ?)", (now, tokens))
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_tokens(self, now: float, tokens: int):
+        self._conn().execute("INSERT INTO llm_calls VALUES (?, 0, ?)", (now, tokens))
+
+    def get(self, key: str, default: float) -> float:
+        row = self._conn().execute("SELECT value FROM limiter_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set(self, key: str, value: float):
+        self._conn().execute("INSERT OR REPLACE INTO limiter_state VALUES (?, ?)", (key, value))
+
+
+def _reserved(tokens: int):
+    holder = _RESERVED_TOKENS.get()
+    if holder is not None:
+        holder[0] = tokens
+
+
+def _wait_needed(now, log, requests, used, rpm, tpm, tokens) -> float:
+    """Seconds until one more request of `tokens` fits both budgets (0 = now)."""
+    if requests + 1 <= rpm and (used + tokens <= tpm or used == 0):
+        return 0.0
+    # Walk the window oldest-first until enough requests/tokens have expired.
+    freed_requests = freed_tokens = 0
+    for t, r, tok in log:
+        freed_requests += r
+        freed_tokens += tok
+        if requests - freed_requests + 1 <= rpm and used - freed_tokens + tokens <= tpm:
+            return max(POLL_SECONDS, t + WINDOW_SECONDS - now)
+    return WINDOW_SECONDS
+
+
+# -------------------------------------------------
+# LIMITER
+# -------------------------------------------------
+class QuotaRateLimiter(BaseRateLimiter):
+    """
+    Requests-per-minute and tokens-per-minute limiter for the Gemini client.
+
+    * Both budgets are tracked over a sliding 60 s window, in SQLite when
+      RATE_LIMIT_DB (or the job store) is configured so all workers share it.
+    * 429 / RESOURCE_EXHAUSTED halves the request budget and pauses callers
+      for the server's retry delay; each success adds half a request back,
+      up to GEMINI_RPM (additive increase, multiplicative decrease).
+    * Waiting callers in this process are served earliest-deadline-first
+      (LLM_DEADLINE), so a quiz about to time out is not stuck behind a
+      fresh one.
+    """
+
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM, path: str = RATE_LIMIT_DB):
+        self.max_rpm = rpm
+        self.tpm = tpm
+        self.window = SqliteWindow(path) if path else MemoryWindow()
+        self._waiters = []  # heap of (deadline, seq)
+        self._seq = itertools.count()
+        self._avg_tokens = 2000.0
+        EFFECTIVE_RPM.set(self.rpm)
+
+    # ---------- adaptive budget ----------
+    @property
+    def rpm(self) -> float:
+        return min(self.max_rpm, self.window.get("rpm", self.max_rpm))
+
+    def record_success(self, tokens: int, reserved: int):
+        now = time.time()
+        if tokens and tokens != reserved:
+            self.window.add_tokens(now, tokens - reserved)
+        if tokens:
+            self._avg_tokens = 0.8 * self._avg_tokens + 0.2 * tokens
+        rpm = min(self.max_rpm, self.rpm + 0.5)
+        self.window.set("rpm", rpm)
+        EFFECTIVE_RPM.set(rpm)
+
+    def record_quota_error(self, retry_after: Optional[float]):
+        QUOTA_ERRORS.inc()
+        rpm = max(1.0, self.rpm / 2)
+        self.window.set("rpm", rpm)
+        self.window.set("cooldown_until", time.time() + (retry_after or DEFAULT_COOLDOWN))
+        EFFECTIVE_RPM.set(rpm)
+        print(f"LLM quota exceeded — limiting to {rpm:.1f} RPM, pausing {retry_after or DEFAULT_COOLDOWN:.0f}s")
+
+    async def _off_loop(self, func, *args):
+        # SQLite writes may wait on another worker's lock; keep the loop free
+        if isinstance(self.window, SqliteWindow):
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def arecord_success(self, tokens: int, reserved: int):
+        await self._off_loop(self.record_success, tokens, reserved)
+
+    async def arecord_quota_error(self, retry_after: Optional[float]):
+        await self._off_loop(self.record_quota_error, retry_after)
+
+    # ---------- acquisition ----------
+    def _try(self) -> Tuple[float, int]:
+        now = time.time()
+        cooldown = self.window.get("cooldown_until", 0.0) - now
+        if cooldown > 0:
+            return cooldown, 0
+        tokens = LLM_PROMPT_TOKENS.get() or int(self._avg_tokens)
+        return self.window.try_reserve(now, self.rpm, self.tpm, tokens), tokens
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        started = time.perf_counter()
+        while True:
+            wait, tokens = self._try()
+            if wait == 0:
+                _reserved(tokens)
+                RATE_LIMIT_WAIT.observe(time.perf_counter() - started)
+                return True
+            if not blocking:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        started = time.perf_counter()
+        entry = (LLM_DEADLINE.get(), next(self._seq))
+        heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                # Only the most urgent waiter may take a slot.
+                if self._waiters[0] == entry:
+                    wait, tokens = await self._off_loop(self._try)
+                    if wait == 0:
+                        _reserved(tokens)
+                        RATE_LIMIT_WAIT.observe(time.perf_counter() - started)
+                        return True
+                else:
+                    wait = POLL_SECONDS
+                if not blocking:
+                    return False
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+
+# -------------------------------------------------
+# FEEDBACK FROM LLM CALLS
+# -------------------------------------------------
+_RETRY_HINT = re.compile(r"retry(?:_delay|Delay| in)[\"':\s{]*(?:seconds:\s*)?(\d+(?:\.\d+)?)", re.I)
+
+
+def parse_quota_error(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """Return (is_quota_error, retry_after_seconds) for an LLM exception."""
+    text = str(error)
+    if "429" not in text and "RESOURCE_EXHAUSTED" not in text and "quota" not in text.lower():
+        return False, None
+    match = _RETRY_HINT.search(text)
+    return True, float(match.group(1)) if match else None
+
+
+class RateLimitFeedback(AsyncCallbackHandler):
+    """
+    Feeds real token usage and quota errors back into the limiter.
+
+    Runs inline, in the caller's context, so it sees the tokens reserved by
+    that caller's acquire.
+    """
+
+    run_inline = True
+
+    def __init__(self, limiter: QuotaRateLimiter):
+        self.limiter = limiter
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs):
+        _RESERVED_TOKENS.set([0])
+
+    async def on_llm_end(self, response, **kwargs):
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if getattr(message, "response_metadata", {}).get("cache_hit"):
+                    return  # served from the response cache, no quota used
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    tokens += usage.get("total_tokens", 0)
+        holder = _RESERVED_TOKENS.get()
+        await self.limiter.arecord_success(tokens, holder[0] if holder else 0)
+
+    async def on_llm_error(self, error, **kwargs):
+        is_quota, retry_after = parse_quota_error(error)
+        if is_quota:
+            await self.limiter.arecord_quota_error(retry_after)
@@ -0,0 +1,117 @@
+import asyncio
+import math
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))
+# Until we have measured anything, assume a job uses its whole quiz budget.
+DEFAULT_JOB_SECONDS = 180.0
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when no queue slot is free."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# -------------------------------------------------
+# JOB SCHEDULER
+# -------------------------------------------------
+class JobScheduler:
+    """
+    Bounded FIFO of quiz jobs drained by a fixed number of workers.
+
+    Admission control happens in submit(): once `max_queued` jobs are
+    waiting, new work is rejected with QueueFull instead of piling onto the
+    shared Gemini rate limiter and Chromium. The Retry-After estimate comes
+    from the running jobs' start times and a moving average of job duration.
+    """
+
+    def __init__(self, runner: Callable[[str, str], Awaitable[None]],
+                 workers: int = MAX_CONCURRENT_JOBS, max_queued: int = MAX_QUEUED_JOBS):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self.avg_job_seconds = DEFAULT_JOB_SECONDS
+        self.completed = 0
+        self.rejected = 0
+        self.running: Dict[str, float] = {}  # job_id -> start time
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    # ---------- lifecycle ----------
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"Scheduler started: {self.workers} workers, queue size {self.max_queued}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---------- admission ----------
+    def submit(self, url: str, job_id: str):
+        """Queue a job or raise QueueFull with a Retry-After estimate."""
+        if self._queue is None:
+            raise RuntimeError("Scheduler is not started")
+        # Idle workers count as capacity, so a burst first fills them and
+        # only then the bounded queue.
+        if self.queue_depth + len(self.running) >= self.workers + self.max_queued:
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+        self._queue.put_nowait((url, job_id))
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is expected to free up."""
+        now = time.time()
+        if not self.running:
+            return 1
+        soonest = min(start + self.avg_job_seconds - now for start in self.running.values())
+        return max(1, math.ceil(soonest))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": len(self.running),
+            "queued": self.queue_depth,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_job_seconds": round(self.avg_job_seconds, 1),
+        }
+
+    # ---------- workers ----------
+    async def _worker(self, index: int):
+        while True:
+            url, job_id = await self._queue.get()
+            started = time.time()
+            self.running[job_id] = started
+            try:
+                await self._run(url, job_id)
+            except Exception as e:
+                print(f"[{job_id}] Job failed on worker {index}: {e}")
+            finally:
+                self.running.pop(job_id, None)
+                self._record(time.time() - started)
+                self._queue.task_done()
+
+    async def _run(self, url: str, job_id: str):
+        # Chains run as coroutines on the server's event loop, so they share
+        # it instead of each pinning a threadpool thread for minutes.
+        await self.runner(url, job_id)
+
+    def _record(self, seconds: float):
+        # Exponential moving average, so capacity estimates follow real load.
+        self.completed += 1
+        self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * seconds
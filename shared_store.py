@@ -1,2 +1,248 @@
-BASE64_STORE = {}
-url_time = {}
\ No newline at end of file
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from deadline import QUIZ_TIME_LIMIT, Deadline
+from job_store import STORE
+from token_counter import TokenCounter
+
+MAX_EVENTS = 1000          # per-job event backlog kept for /jobs/{id}/events
+MAX_FINISHED_SESSIONS = 200
+REMOTE_POLL_SECONDS = 1.0  # how often a non-owning worker re-reads the store
+
+
+# -------------------------------------------------
+# PER-JOB SESSION STATE
+# -------------------------------------------------
+@dataclass
+class Session:
+    """
+    Everything a single quiz chain needs to remember between graph steps.
+
+    One Session exists per /solve job. The job id is carried in the LangGraph
+    state and injected into every tool, so concurrent chains in the same
+    process never see each other's URLs, timers, retry counters or blobs.
+    """
+    job_id: str
+    url: str                      # quiz URL the agent is currently working on
+    offset: float = 0.0           # start of the 90 s retry window, 0 = not retrying
+    url_time: Dict[str, float] = field(default_factory=dict)
+    base64_store: Dict[str, str] = field(default_factory=dict)
+    raw_html: Dict[str, str] = field(default_factory=dict, repr=False)
+    attempts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    # Progress, reported by /jobs/{id}
+    status: str = "queued"        # queued | running | done | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    steps: int = 0
+    last_result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    remote: bool = False          # read-only copy of a job owned by another worker
+    bypass_cache: bool = False    # never answer this job from the LLM response cache
+    tokens: TokenCounter = field(default_factory=TokenCounter, repr=False)
+    # post_request calls from one turn run concurrently but must update the
+    # URL / retry state one at a time.
+    submit_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+    # tool_call_id -> (args, task) for tools started while the LLM was still streaming
+    early_calls: Dict[str, Any] = field(default_factory=dict, repr=False)
+    # url -> task rendering the next quiz page, started right after a submission
+    prefetched: Dict[str, Any] = field(default_factory=dict, repr=False)
+    events: List[Dict[str, Any]] = field(default_factory=list, repr=False)
+    _seq: int = field(default=0, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def workdir(self) -> str:
+        """Private scratch directory for downloads and generated code."""
+        path = os.path.join("LLMFiles", self.job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def first_seen(self, url: str) -> float:
+        """Return when `url` was first reached, recording now if it is new."""
+        if url not in self.url_time:
+            self.url_time[url] = time.time()
+        return self.url_time[url]
+
+    def deadline(self) -> Optional[Deadline]:
+        """Time budget for the current quiz URL (None before it is reached)."""
+        started = self.url_time.get(self.url)
+        if started is None:
+            return None
+        return Deadline(started_at=started, retry_started_at=self.offset)
+
+    # ---------- Base64 blobs ----------
+    def put_base64(self, key: str, value: str):
+        self.base64_store[key] = value
+        if STORE is not None:
+            STORE.put_blob(self.job_id, key, value)
+
+    def get_base64(self, key: str) -> str:
+        if key not in self.base64_store and STORE is not None:
+            value = STORE.get_blob(self.job_id, key)
+            if value is not None:
+                self.base64_store[key] = value
+        return self.base64_store[key]
+
+    # ---------- raw HTML behind condensed pages ----------
+    def put_raw_html(self, html: str) -> str:
+        # Content-addressed, so a replayed chain sees the same handles (and
+        # prompts) as the original run.
+        handle = f"HTML_KEY:{hashlib.sha256(html.encode()).hexdigest()[:32]}"
+        self.raw_html[handle] = html
+        if STORE is not None:
+            STORE.put_blob(self.job_id, handle, html)
+        return handle
+
+    def get_raw_html(self, handle: str) -> str:
+        if handle not in self.raw_html and STORE is not None:
+            value = STORE.get_blob(self.job_id, handle)
+            if value is not None:
+                self.raw_html[handle] = value
+        return self.raw_html[handle]
+
+    # ---------- progress events ----------
+    def publish(self, kind: str, **data):
+        """Append a progress event, persist the job and wake up SSE listeners."""
+        self._seq += 1
+        event = {"id": self._seq, "event": kind, "time": time.time(), **data}
+        self.events.append(event)
+        if len(self.events) > MAX_EVENTS:
+            del self.events[:len(self.events) - MAX_EVENTS]
+        if STORE is not None:
+            STORE.append_event(self.job_id, event)
+            STORE.save(self)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def save(self):
+        if STORE is not None:
+            STORE.save(self)
+
+    def release(self):
+        """Free the page, blob and token caches of a finished job; status views keep working."""
+        self.raw_html.clear()
+        self.base64_store.clear()
+        self.tokens = TokenCounter()
+
+    def events_after(self, last_id: int) -> List[Dict[str, Any]]:
+        if self.remote:
+            return STORE.events_after(self.job_id, last_id)
+        return [e for e in self.events if e["id"] > last_id]
+
+    async def wait_for_event(self, timeout: float):
+        """Block until the next publish() or `timeout` seconds, whichever is first."""
+        if self.remote:
+            # No cross-process notification: poll the store instead.
+            await asyncio.sleep(min(timeout, REMOTE_POLL_SECONDS))
+            self._reload()
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _reload(self):
+        fields = STORE.load(self.job_id)
+        if fields is not None:
+            for name in ("url", "status", "offset", "created_at", "started_at", "finished_at",
+                         "steps", "last_result", "error", "url_time"):
+                setattr(self, name, fields[name])
+            self.attempts = defaultdict(int, fields["attempts"])
+            self._seq = fields["last_event_id"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-safe view of the job for the status endpoint."""
+        now = self.finished_at or time.time()
+        deadline = self.deadline()
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "url": self.url,
+            "steps": self.steps,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(now - self.created_at, 2),
+            "quiz_elapsed_seconds": round(deadline.elapsed(now), 2) if deadline else None,
+            "quiz_deadline_seconds": QUIZ_TIME_LIMIT,
+            "quiz_remaining_seconds": round(deadline.remaining(now), 2) if deadline else None,
+            "attempts": self.attempts.get(self.url, 0),
+            "last_result": self.last_result,
+            "error": self.error,
+        }
+
+
+SESSIONS: Dict[str, Session] = {}
+
+
+def create_session(url: str, bypass_cache: bool = False) -> Session:
+    _prune_finished()
+    job_id = uuid.uuid4().hex
+    session = Session(job_id=job_id, url=url, bypass_cache=bypass_cache)
+    session.first_seen(url)
+    SESSIONS[job_id] = session
+    session.save()
+    return session
+
+
+def get_session(job_id: str) -> Session:
+    session = SESSIONS.get(job_id)
+    if session is None:
+        raise KeyError(f"Unknown job id: {job_id}")
+    return session
+
+
+def find_session(job_id: str) -> Optional[Session]:
+    """
+    Look a job up for read-only status views: this worker's own sessions
+    first, then the shared job store for jobs owned by other workers.
+    """
+    session = SESSIONS.get(job_id)
+    if session is not None or STORE is None:
+        return session
+    if STORE.load(job_id) is None:
+        return None
+    session = Session(job_id=job_id, url="", remote=True)
+    session._reload()
+    return session
+
+
+def restore_session(job_id: str) -> Optional[Session]:
+    """Rebuild an interrupted job's Session from the job store, owned by this worker."""
+    if STORE is None or STORE.load(job_id) is None:
+        return None
+    session = Session(job_id=job_id, url="")
+    session._reload()
+    session.status = "queued"
+    SESSIONS[job_id] = session
+    return session
+
+
+def drop_session(job_id: str) -> Optional[Session]:
+    if STORE is not None:
+        STORE.delete(job_id)
+    return SESSIONS.pop(job_id, None)
+
+
+def _prune_finished():
+    """Forget the oldest finished jobs once too many are kept for status queries."""
+    finished = [s for s in SESSIONS.values() if s.finished]
+    excess = len(finished) - MAX_FINISHED_SESSIONS
+    if excess > 0:
+        finished.sort(key=lambda s: s.finished_at or 0)
+        for s in finished[:excess]:
+            SESSIONS.pop(s.job_id, None)
+    if STORE is not None:
+        STORE.prune(MAX_FINISHED_SESSIONS)
@@ -0,0 +1,84 @@
+import json
+from typing import Dict, Iterable, Tuple
+
+CHARS_PER_TOKEN = 4        # rough average for Gemini on English + code
+MESSAGE_OVERHEAD = 4       # role/formatting tokens added per message
+
+
+def estimate_tokens(message) -> int:
+    """Cheap local token estimate from a message's text, tool calls and name."""
+    content = getattr(message, "content", "")
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                parts.append(str(part.get("text", "")) if part.get("type", "text") == "text" else "")
+            else:
+                parts.append(str(part))
+        content = "".join(parts)
+    chars = len(content) if isinstance(content, str) else len(str(content))
+    for call in getattr(message, "tool_calls", None) or []:
+        chars += len(call.get("name", "")) + len(json.dumps(call.get("args", {}), default=str))
+    return MESSAGE_OVERHEAD + chars // CHARS_PER_TOKEN
+
+
+class TokenCounter:
+    """
+    Per-session token accounting for trim_messages.
+
+    Each message is counted once and cached by its id (add_messages gives
+    every message in the graph state an id). AI messages use the exact
+    output token count Gemini reports; everything else uses the local
+    estimate scaled by a ratio learned from the prompt sizes Gemini reports.
+    A trim therefore costs a dictionary lookup per old message instead of a
+    (possibly remote) count of the whole history.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[int, bool]] = {}  # id -> (tokens, exact)
+        self.ratio = 1.0
+
+    def _count(self, message) -> Tuple[int, bool]:
+        msg_id = getattr(message, "id", None)
+        if msg_id is not None and msg_id in self._cache:
+            return self._cache[msg_id]
+
+        usage = getattr(message, "usage_metadata", None)
+        if usage and usage.get("output_tokens"):
+            entry = (usage["output_tokens"], True)
+        else:
+            entry = (estimate_tokens(message), False)
+        if msg_id is not None:
+            self._cache[msg_id] = entry
+        return entry
+
+    def __call__(self, messages: Iterable) -> int:
+        exact = estimated = 0
+        for message in messages:
+            tokens, is_exact = self._count(message)
+            if is_exact:
+                exact += tokens
+            else:
+                estimated += tokens
+        return exact + int(estimated * self.ratio)
+
+    def calibrate(self, prompt: Iterable, usage) -> None:
+        """Nudge the estimate ratio toward Gemini's reported prompt size."""
+        if not usage or not usage.get("input_tokens"):
+            return
+        exact = estimated = 0
+        for message in prompt:
+            tokens, is_exact = self._count(message)
+            if is_exact:
+                exact += tokens
+            else:
+                estimated += tokens
+        if estimated <= 0:
+            return
+        observed = (usage["input_tokens"] - exact) / estimated
+        if observed > 0:
+            self.ratio = 0.7 * self.ratio + 0.3 * min(max(observed, 0.25), 4.0)
+
+    def forget(self, message_ids: Iterable[str]):
+        for msg_id in message_ids:
+            self._cache.pop(msg_id, None)
@@ -0,0 +1,198 @@
+import ast
+import json
+import os
+import re
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage
+
+from metrics import Counter
+
+# Recover malformed tool calls locally before spending another rate-limited
+# LLM call on "please try again". 0 always asks the model.
+LOCAL_TOOL_REPAIR = os.getenv("LOCAL_TOOL_REPAIR", "1") == "1"
+
+TOOL_CALL_REPAIRS = Counter(
+    "quiz_tool_call_repairs_total", "Malformed tool calls, by how they were recovered (local or llm_retry)."
+)
+
+_FENCE = re.compile(r"```[\w-]*\s*\n(.*?)(?:```|$)", re.S)
+_VALID_ESCAPES = '"\\/bfnrtu'
+_ARG_KEYS = ("args", "arguments", "parameters")
+
+
+# -------------------------------------------------
+# JSON
+# -------------------------------------------------
+def _fix_json(text: str) -> Optional[str]:
+    """
+    Fix the usual ways a model breaks JSON: raw newlines or tabs inside
+    strings, invalid backslash escapes and trailing commas.
+
+    Output that ends inside a string or with brackets still open was cut
+    off; closing it would run the tool with truncated arguments (e.g. submit
+    half an answer), so None is returned instead.
+    """
+    out, depth = [], 0
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                if ch not in _VALID_ESCAPES:
+                    out.append("\\")  # "\d" -> "\\d"
+                out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch == '"':
+                out.append(ch)
+                in_string = False
+            else:
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}.get(ch, ch))
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+        out.append(ch)
+    if in_string or depth > 0:
+        return None
+    return re.sub(r",\s*([}\]])", r"\1", "".join(out))
+
+
+def parse_json(text: str) -> Optional[Any]:
+    """json.loads, then again after _fix_json; None if neither parses."""
+    text = text.strip()
+    for attempt in (text, _fix_json(text)):
+        if attempt is None:
+            continue
+        try:
+            return json.loads(attempt, strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+# -------------------------------------------------
+# PYTHON-STYLE CALLS
+# -------------------------------------------------
+def _escape_newlines(source: str) -> str:
+    """
+    Escape raw newlines inside single-line Python string literals. Gemini
+    writes multi-line code as `code="..."` with literal line breaks, which
+    ast.parse rejects.
+    """
+    out, quote, escaped = [], None, False
+    i = 0
+    while i < len(source):
+        ch = source[i]
+        if quote is None:
+            if source.startswith(('"""', "'''"), i):
+                end = source.find(source[i:i + 3], i + 3)
+                end = len(source) if end < 0 else end + 3
+                out.append(source[i:end])  # triple-quoted: newlines are legal
+                i = end
+                continue
+            if ch in "\"'":
+                quote = ch
+        elif escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == quote:
+            quote = None
+        elif ch in "\r\n":
+            ch = "\\n" if ch == "\n" else "\\r"
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _python_calls(text: str, names) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Calls written as Python, the form Gemini uses in its malformed-call
+    message: `print(default_api.run_code(code="..."))`.
+    """
+    try:
+        tree = ast.parse(_escape_newlines(text.strip()))
+    except SyntaxError:
+        return []
+    calls = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+        if name not in names or node.args:
+            continue
+        try:
+            calls.append((name, {kw.arg: ast.literal_eval(kw.value) for kw in node.keywords}))
+        except (ValueError, TypeError, SyntaxError):
+            return []
+    return calls
+
+
+# -------------------------------------------------
+# REPAIR
+# -------------------------------------------------
+def _json_calls(value: Any, name: Optional[str], names) -> List[Tuple[str, Dict[str, Any]]]:
+    """Tool calls in parsed JSON: bare args (name known) or {"name": ..., "args": ...} objects."""
+    if isinstance(value, list):
+        return [call for item in value for call in _json_calls(item, name, names)]
+    if not isinstance(value, dict):
+        return []
+    if value.get("name") in names:
+        args = next((value[k] for k in _ARG_KEYS if k in value), {})
+        return [(value["name"], args)] if isinstance(args, dict) else []
+    if "tool_calls" in value:
+        return _json_calls(value["tool_calls"], None, names)
+    return [(name, value)] if name else []
+
+
+def _sources(message) -> List[Tuple[Optional[str], str]]:
+    """Raw text the intended calls may be recovered from, as (tool name if known, text)."""
+    sources = [(call.get("name"), call.get("args") or "") for call in getattr(message, "invalid_tool_calls", None) or []]
+    finish_message = message.response_metadata.get("finish_message")
+    if finish_message:
+        sources.append((None, finish_message.split(":", 1)[-1]))
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    if content:
+        sources.extend((None, block) for block in _FENCE.findall(content))
+        sources.append((None, content))
+    return sources
+
+
+def repair_tool_calls(message, tools_by_name: Dict[str, Any]) -> Optional[AIMessage]:
+    """
+    Rebuild a malformed tool-call turn without asking the model again.
+
+    Returns a copy of `message` (same id, so it replaces the original in the
+    graph state) with the recovered tool calls, or None if nothing could be
+    recovered or the arguments do not validate against the tool's schema.
+    """
+    for name, text in _sources(message):
+        calls = _python_calls(text, tools_by_name)
+        if not calls:
+            parsed = parse_json(text)
+            calls = _json_calls(parsed, name, tools_by_name) if parsed is not None else []
+        if not calls:
+            continue
+        try:
+            for call_name, args in calls:
+                tools_by_name[call_name].tool_call_schema.model_validate(args)
+        except Exception:
+            continue
+        return AIMessage(
+            content="",
+            id=message.id,
+            tool_calls=[{"name": n, "args": a, "id": str(uuid.uuid4())} for n, a in calls],
+            response_metadata={**message.response_metadata, "finish_reason": "STOP", "repaired": True},
+            usage_metadata=getattr(message, "usage_metadata", None),
+        )
+    return None
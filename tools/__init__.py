@@ -1,8 +1,57 @@
-from .web_scraper import get_rendered_html
-from .run_code import run_code 
-from .send_request import post_request
-from .download_file import download_file
-from .add_dependencies import add_dependencies
-from .image_content_extracter import ocr_image_tool
-from .audio_transcribing import transcribe_audio
-from .encode_image_to_base64 import encode_image_to_base64
\ No newline at end of file
+"""
+Agent tools, registered by name and imported on first access.
+
+`from tools import run_code` only imports tools/run_code.py. The tool
+modules themselves keep their heavy dependencies (Playwright, bs4, PIL,
+pytesseract, speech_recognition, pydub) inside the tool bodies, so building
+the tool list for `bind_tools` stays cheap; `preload()` pulls those
+dependencies in ahead of time for the warm-up phase.
+"""
+import importlib
+
+TOOL_MODULES = {
+    "get_rendered_html": ".web_scraper",
+    "get_raw_html": ".web_scraper",
+    "run_code": ".run_code",
+    "post_request": ".send_request",
+    "download_file": ".download_file",
+    "add_dependencies": ".add_dependencies",
+    "ocr_image_tool": ".image_content_extracter",
+    "transcribe_audio": ".audio_transcribing",
+    "encode_image_to_base64": ".encode_image_to_base64",
+}
+
+HEAVY_DEPENDENCIES = (
+    "playwright.async_api",
+    "bs4",
+    "PIL.Image",
+    "pytesseract",
+    "speech_recognition",
+    "pydub",
+)
+
+__all__ = list(TOOL_MODULES)
+
+
+def __getattr__(name):
+    module = TOOL_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(TOOL_MODULES))
+
+
+def get_tool(name: str):
+    """Look a tool up by its registered name."""
+    return __getattr__(name)
+
+
+def preload():
+    """Import every heavy tool dependency now instead of on first use."""
+    for module in HEAVY_DEPENDENCIES:
+        importlib.import_module(module)
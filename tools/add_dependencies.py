@@ -1,10 +1,17 @@
-from typing import List
+from typing import Annotated, List, Optional
 from langchain_core.tools import tool
-import subprocess
+from langgraph.prebuilt import InjectedState
+from deadline import tool_timeout
+from .limits import subprocess_slot
+from .run_code import communicate
+import asyncio
 
 
 @tool
-def add_dependencies(dependencies: List[str]) -> str:
+async def add_dependencies(
+    dependencies: List[str],
+    deadline: Annotated[Optional[dict], InjectedState("deadline")] = None,
+) -> str:
     """
     Install the given Python packages into the environment.
 
@@ -19,19 +26,20 @@ def add_dependencies(dependencies: List[str]) -> str:
     """
 
     try:
-        subprocess.check_call(
-            ["uv", "add"] + dependencies,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        return "Successfully installed dependencies: " + ", ".join(dependencies)
-    
-    except subprocess.CalledProcessError as e:
+        async with subprocess_slot():
+            proc = await asyncio.create_subprocess_exec(
+                "uv", "add", *dependencies,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await communicate(proc, tool_timeout(deadline, floor=10.0))
+        if proc.returncode == 0:
+            return "Successfully installed dependencies: " + ", ".join(dependencies)
+
         return (
             "Dependency installation failed.\n"
-            f"Exit code: {e.returncode}\n"
-            f"Error: {e.stderr or 'No error output.'}"
+            f"Exit code: {proc.returncode}\n"
+            f"Error: {stderr.decode(errors='replace') or 'No error output.'}"
         )
     
     except Exception as e:
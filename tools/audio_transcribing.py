@@ -1,10 +1,11 @@
-from langchain.tools import tool
-import speech_recognition as sr
-from pydub import AudioSegment
+from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
+from shared_store import get_session
+from typing import Annotated
 import os
 
 @tool
-def transcribe_audio(file_path: str) -> str:
+def transcribe_audio(file_path: str, job_id: Annotated[str, InjectedState("job_id")] = "") -> str:
     """
     Transcribe an MP3 or WAV audio file into text using Google's Web Speech API.
 
@@ -20,8 +21,11 @@ def transcribe_audio(file_path: str) -> str:
         - Uses Google's free recognize_google() API (requires internet).
     """
     try:
+        import speech_recognition as sr
+        from pydub import AudioSegment
+
         # Convert MP3 → WAV if needed
-        file_path = os.path.join("LLMFiles", file_path)
+        file_path = os.path.join(get_session(job_id).workdir, file_path)
         final_path = file_path
         if file_path.lower().endswith(".mp3"):
             sound = AudioSegment.from_mp3(file_path)
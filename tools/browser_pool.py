@@ -0,0 +1,160 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from metrics import Counter
+
+# Launching Chromium costs seconds, so browsers are kept alive and shared by
+# every render on the event loop; each call still gets its own fresh context
+# (cookies/storage are never shared between calls or jobs).
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+# Long-lived Chromium grows; retire a browser after this many pages...
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))
+# ...or once its processes use more than this much memory (0 disables).
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+
+BROWSER_LAUNCHES = Counter("quiz_browser_launches_total", "Chromium processes started by the browser pool.")
+BROWSER_RECYCLES = Counter("quiz_browser_recycles_total", "Pooled browsers retired, by reason.")
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+@dataclass
+class PooledBrowser:
+    browser: Any
+    pages: int = 0    # contexts handed out so far
+    active: int = 0   # contexts currently open
+    retiring: bool = False
+
+    async def rss_mb(self) -> float:
+        """Resident memory of the browser and its renderer/GPU processes (Linux only)."""
+        cdp = await self.browser.new_browser_cdp_session()
+        try:
+            info = await cdp.send("SystemInfo.getProcessInfo")
+        finally:
+            await cdp.detach()
+        return sum(_rss_mb(process["id"]) for process in info.get("processInfo", []))
+
+
+class BrowserPool:
+    """
+    Up to `size` Chromium browsers for one event loop.
+
+    A call goes to an idle browser if there is one, otherwise a new browser
+    is launched while the pool is below `size`, otherwise the least busy
+    browser takes it. Browsers past BROWSER_MAX_PAGES or BROWSER_MAX_RSS_MB
+    stop taking new calls and are closed once their open contexts finish.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE):
+        self.size = max(1, size)
+        self.browsers: List[PooledBrowser] = []
+        self._playwright = None
+        self._lock = asyncio.Lock()
+
+    async def _launch(self) -> PooledBrowser:
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=True)
+        BROWSER_LAUNCHES.inc()
+        entry = PooledBrowser(browser)
+        self.browsers.append(entry)
+        return entry
+
+    async def _acquire(self) -> PooledBrowser:
+        async with self._lock:
+            for entry in [b for b in self.browsers if not b.browser.is_connected()]:
+                self.browsers.remove(entry)
+                BROWSER_RECYCLES.inc(reason="disconnected")
+            live = [b for b in self.browsers if not b.retiring]
+            idle = [b for b in live if b.active == 0]
+            if idle:
+                entry = idle[0]
+            elif len(live) < self.size:
+                entry = await self._launch()
+            else:
+                entry = min(live, key=lambda b: b.active)
+            entry.active += 1
+            entry.pages += 1
+            return entry
+
+    async def _release(self, entry: PooledBrowser):
+        entry.active -= 1
+        if not entry.retiring:
+            reason = None
+            if entry.pages >= BROWSER_MAX_PAGES:
+                reason = "pages"
+            elif BROWSER_MAX_RSS_MB and entry.browser.is_connected():
+                try:
+                    if await entry.rss_mb() > BROWSER_MAX_RSS_MB:
+                        reason = "rss"
+                except Exception as e:
+                    print(f"Could not read browser memory: {e}")
+            if reason:
+                entry.retiring = True
+                BROWSER_RECYCLES.inc(reason=reason)
+                print(f"Recycling browser after {entry.pages} pages ({reason})")
+        if entry.retiring and entry.active == 0:
+            async with self._lock:
+                if entry in self.browsers:
+                    self.browsers.remove(entry)
+            await entry.browser.close()
+
+    @asynccontextmanager
+    async def context(self, **options):
+        """A fresh browser context on a pooled browser, closed on exit."""
+        entry = await self._acquire()
+        try:
+            context = await entry.browser.new_context(**options)
+            try:
+                yield context
+            finally:
+                await context.close()
+        finally:
+            await self._release(entry)
+
+    async def close(self):
+        async with self._lock:
+            browsers, self.browsers = self.browsers, []
+            for entry in browsers:
+                await entry.browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+# One pool per event loop, like the HTTP client: `run_agent` (sync) spins up
+# a fresh loop per call and Playwright objects cannot cross loops.
+_pools = {}
+
+
+def get_pool() -> BrowserPool:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = BrowserPool()
+    return pool
+
+
+def browser_context(**options):
+    """`async with browser_context() as context:` on the running loop's pool."""
+    return get_pool().context(**options)
+
+
+async def close_browser():
+    """Close the current loop's browsers (used on shutdown)."""
+    pool: Optional[BrowserPool] = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
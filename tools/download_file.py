@@ -1,12 +1,22 @@
 from langchain_core.tools import tool
-import requests
+from langgraph.prebuilt import InjectedState
+from shared_store import get_session
+from deadline import tool_timeout
+from typing import Annotated, Optional
+from .http_client import get_client
+import asyncio
 import os
 
 @tool
-def download_file(url: str, filename: str) -> str:
+async def download_file(
+    url: str,
+    filename: str,
+    job_id: Annotated[str, InjectedState("job_id")] = "",
+    deadline: Annotated[Optional[dict], InjectedState("deadline")] = None,
+) -> str:
     """
     Download a file from a URL and save it with the given filename
-    in the current working directory.
+    in the job's working directory.
 
     Args:
         url (str): Direct URL to the file.
@@ -15,17 +25,22 @@ def download_file(url: str, filename: str) -> str:
     Returns:
         str: Full path to the saved file.
     """
+    timeout = tool_timeout(deadline, floor=5.0)
     try:
-        response = requests.get(url, stream=True)
+        path = os.path.join(get_session(job_id).workdir, filename)
+        # httpx timeouts are per read, so the whole transfer is bounded too
+        await asyncio.wait_for(_fetch(url, path, timeout), timeout)
+        return filename
+    except asyncio.TimeoutError:
+        return f"Error downloading file: gave up after {timeout:.0f}s (quiz deadline)"
+    except Exception as e:
+        return f"Error downloading file: {str(e)}"
+
+
+async def _fetch(url: str, path: str, timeout: float):
+    async with get_client().stream("GET", url, timeout=timeout) as response:
         response.raise_for_status()
-        directory_name = "LLMFiles"
-        os.makedirs(directory_name, exist_ok=True)
-        path = os.path.join(directory_name, filename)
         with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
+            async for chunk in response.aiter_bytes(chunk_size=8192):
                 if chunk:
                     f.write(chunk)
-
-        return filename
-    except Exception as e:
-        return f"Error downloading file: {str(e)}"
\ No newline at end of file
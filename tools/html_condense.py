@@ -0,0 +1,130 @@
+import csv
+import io
+import re
+from urllib.parse import urljoin
+
+# Elements that never carry content the agent needs.
+DROP_TAGS = ("script", "style", "noscript", "template", "svg", "canvas", "iframe",
+             "link", "meta", "nav", "footer", "aside")
+BLOCK_TAGS = ("p", "div", "br", "hr", "li", "tr", "section", "article", "main", "header",
+              "form", "table", "pre", "ul", "ol", "dl", "dt", "dd", "blockquote",
+              "h1", "h2", "h3", "h4", "h5", "h6", "figure", "figcaption", "label")
+MAX_TEXT_CHARS = 40000
+
+
+def _cell_text(cell) -> str:
+    return " ".join(cell.get_text(" ").split())
+
+
+def _table_to_csv(table) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in table.find_all("tr"):
+        cells = row.find_all(["th", "td"])
+        if cells:
+            writer.writerow([_cell_text(c) for c in cells])
+    return out.getvalue().strip()
+
+
+def _field_text(field) -> str:
+    """A form field as [tag attrs]; a select lists its options with their values."""
+    attrs = " ".join(
+        f"{k}={field.get(k)}" for k in ("type", "name", "value", "placeholder") if field.get(k)
+    )
+    text = f"\n[{field.name} {attrs}]\n"
+    if field.name == "select":
+        for option in field.find_all("option"):
+            label = _cell_text(option)
+            value = option.get("value", label)
+            selected = " selected" if option.has_attr("selected") else ""
+            text += f"[option value={value}{selected}] {label}\n"
+    return text
+
+
+def condense_html(html: str, base_url: str) -> dict:
+    """
+    Turn rendered HTML into compact, LLM-friendly text.
+
+    Keeps visible text, links as [text](url), images/audio/video as
+    ![alt](url), forms with their fields (select options included), tables
+    as CSV and <pre>/<code> blocks fenced. Scripts, styles, navigation and
+    footers are dropped; the raw HTML stays available to the agent through
+    get_raw_html.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    for tag in soup.find_all(DROP_TAGS):
+        tag.decompose()
+    root = soup.body or soup
+
+    images, links = [], []
+    # Verbatim blocks are swapped for placeholders so whitespace
+    # normalisation below cannot mangle code indentation or CSV cells.
+    verbatim = []
+
+    def keep(block: str) -> str:
+        verbatim.append(block)
+        return f"\n\x00{len(verbatim) - 1}\x00\n"
+
+    for pre in root.find_all("pre"):
+        pre.replace_with(keep(f"```\n{pre.get_text().strip(chr(10))}\n```"))
+    for code in root.find_all("code"):
+        code.replace_with(f"`{code.get_text()}`")
+
+    for img in root.find_all("img"):
+        src = img.get("src")
+        if src:
+            url = urljoin(base_url, src)
+            images.append(url)
+            img.replace_with(f"![{img.get('alt', '')}]({url})")
+        else:
+            img.decompose()
+    for media in root.find_all(["audio", "video", "source"]):
+        src = media.get("src")
+        if src:
+            media.insert_before(f"\n[{media.name}]({urljoin(base_url, src)})\n")
+    for a in root.find_all("a"):
+        href = a.get("href")
+        text = " ".join(a.get_text(" ").split())
+        if href and not href.startswith(("javascript:", "#")):
+            url = urljoin(base_url, href)
+            links.append(url)
+            a.replace_with(f"[{text or url}]({url})")
+
+    for form in root.find_all("form"):
+        action = urljoin(base_url, form.get("action", "")) if form.get("action") else base_url
+        form.insert(0, f"\n[FORM method={form.get('method', 'get').upper()} action={action}]\n")
+        for field in form.find_all(["input", "select", "textarea", "button"]):
+            field.replace_with(_field_text(field))
+    for select in root.find_all("select"):  # outside any form
+        select.replace_with(_field_text(select))
+
+    # Only tables without tables inside hold data. One that wraps other
+    # tables is layout: it stays text, with the inner tables as CSV blocks.
+    for table in root.find_all("table"):
+        if table.find("table") is None:
+            table.replace_with(keep(f"```csv\n{_table_to_csv(table)}\n```"))
+        else:
+            for cell in table.find_all(["td", "th"]):
+                cell.append(" ")
+
+    for level in range(1, 7):
+        for heading in root.find_all(f"h{level}"):
+            heading.insert(0, "#" * level + " ")
+    for li in root.find_all("li"):
+        li.insert(0, "- ")
+    for block in root.find_all(BLOCK_TAGS):
+        block.append("\n")
+
+    lines = [re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in root.get_text().splitlines()]
+    text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+    text = re.sub(r"\x00(\d+)\x00", lambda m: verbatim[int(m.group(1))], text)
+    if title:
+        text = f"Title: {title}\n\n{text}"
+    truncated = len(text) > MAX_TEXT_CHARS
+    if truncated:
+        text = text[:MAX_TEXT_CHARS] + "\n... [TRUNCATED - use get_raw_html for the rest]"
+
+    return {"text": text, "images": images, "links": links, "truncated": truncated}
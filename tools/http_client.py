@@ -0,0 +1,29 @@
+import asyncio
+import httpx
+from .limits import MAX_HTTP_CONNECTIONS
+
+# One pooled client per event loop: connections cannot be shared across loops,
+# and `run_agent` (sync) spins up a fresh loop per call.
+_clients = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared async HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        # The pool size caps concurrent HTTP connections across all tool calls
+        client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=None,
+            limits=httpx.Limits(max_connections=MAX_HTTP_CONNECTIONS)
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    """Close the current loop's client (used on shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,12 +1,14 @@
-import pytesseract
-from PIL import Image
 from io import BytesIO
+from langgraph.prebuilt import InjectedState
+from shared_store import get_session
+from typing import Annotated
 import base64
 import os
 
 
-def load_image(image_input):
+def load_image(image_input, workdir="LLMFiles"):
     """Internal helper to load an image from bytes, file path, base64, or PIL.Image."""
+    from PIL import Image
     if isinstance(image_input, bytes):
         return Image.open(BytesIO(image_input)).convert("RGB")
     if isinstance(image_input, Image.Image):
@@ -15,11 +17,11 @@ def load_image(image_input):
         if image_input.startswith("data:"):   # base64 data URL
             _, b64 = image_input.split(",", 1)
             return Image.open(BytesIO(base64.b64decode(b64))).convert("RGB")
-        return Image.open(os.path.join("LLMFiles", image_input)).convert("RGB")
+        return Image.open(os.path.join(workdir, image_input)).convert("RGB")
     raise ValueError("Unsupported image input type")
 
 
-def ocr_image_tool(payload: dict) -> dict:
+def ocr_image_tool(payload: dict, job_id: Annotated[str, InjectedState("job_id")] = "") -> dict:
     """
     Extract text from an image using pytesseract OCR.
 
@@ -41,7 +43,8 @@ def ocr_image_tool(payload: dict) -> dict:
         image_data = payload["image"]
         lang = payload.get("lang", "eng")
 
-        img = load_image(image_data)
+        import pytesseract
+        img = load_image(image_data, get_session(job_id).workdir)
         text = pytesseract.image_to_string(img, lang=lang)
 
         return {
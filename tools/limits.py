@@ -0,0 +1,28 @@
+import asyncio
+import os
+
+# Caps on how many tool calls may hold each scarce resource at once. Tool
+# calls from one agent turn run concurrently (ToolNode gathers them); these
+# keep a burst from opening dozens of Chromium pages or `uv` processes.
+MAX_BROWSER_PAGES = int(os.getenv("MAX_BROWSER_PAGES", "4"))
+MAX_SUBPROCESSES = int(os.getenv("MAX_SUBPROCESSES", "4"))
+MAX_HTTP_CONNECTIONS = int(os.getenv("MAX_HTTP_CONNECTIONS", "32"))
+
+# Semaphores belong to one event loop, like the HTTP client and browser.
+_semaphores = {}
+
+
+def _slot(name: str, size: int) -> asyncio.Semaphore:
+    key = (asyncio.get_running_loop(), name)
+    semaphore = _semaphores.get(key)
+    if semaphore is None:
+        semaphore = _semaphores[key] = asyncio.Semaphore(size)
+    return semaphore
+
+
+def browser_slot() -> asyncio.Semaphore:
+    return _slot("browser", MAX_BROWSER_PAGES)
+
+
+def subprocess_slot() -> asyncio.Semaphore:
+    return _slot("subprocess", MAX_SUBPROCESSES)
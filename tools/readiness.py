@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+from typing import Tuple
+
+from metrics import Counter, Histogram
+
+# How get_rendered_html decides a page is ready to read:
+#   quiescence  - DOMContentLoaded, then no DOM mutations for READY_QUIET_MS
+#                 and no script/XHR/fetch requests in flight
+#   settle      - DOMContentLoaded, then a fixed READY_SETTLE_MS pause
+#   networkidle - Playwright's 500 ms of network silence (the old behaviour)
+READY_STRATEGY = os.getenv("READY_STRATEGY", "quiescence")
+# CSS selector that marks a page as ready as soon as it is attached (any strategy).
+READY_SELECTOR = os.getenv("READY_SELECTOR", "")
+READY_QUIET_MS = int(os.getenv("READY_QUIET_MS", "500"))
+READY_SETTLE_MS = int(os.getenv("READY_SETTLE_MS", "1000"))
+# Polling, websockets or endless animations never go quiet; stop waiting after this.
+READY_MAX_WAIT_MS = int(os.getenv("READY_MAX_WAIT_MS", "8000"))
+POLL_INTERVAL = 0.05
+
+READY_CONDITIONS = Counter("quiz_page_ready_total", "Browser renders by the condition that ended the readiness wait.")
+READY_SECONDS = Histogram("quiz_page_ready_seconds", "Navigation plus readiness wait per browser render.")
+
+# Timestamp of the last DOM change, installed before any page script runs.
+_MUTATION_WATCH = """
+(() => {
+  window.__quizLastMutation = performance.now();
+  new MutationObserver(() => { window.__quizLastMutation = performance.now(); })
+    .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+})();
+"""
+_QUIET_FOR = "() => performance.now() - (window.__quizLastMutation || 0)"
+# Requests that can still change the DOM; images, fonts and the like cannot.
+_TRACKED_TYPES = ("document", "script", "xhr", "fetch")
+
+
+class _Inflight:
+    """Counts the page's pending requests that may still change the DOM."""
+
+    def __init__(self, page):
+        self.pending = set()
+        page.on("request", self._started)
+        page.on("requestfinished", self._done)
+        page.on("requestfailed", self._done)
+
+    def _started(self, request):
+        if request.resource_type in _TRACKED_TYPES:
+            self.pending.add(request)
+
+    def _done(self, request):
+        self.pending.discard(request)
+
+
+async def _selector_attached(page) -> bool:
+    if not READY_SELECTOR:
+        return False
+    try:
+        return await page.query_selector(READY_SELECTOR) is not None
+    except Exception:
+        return False  # the page navigated mid-check
+
+
+async def _quiet_for_ms(page) -> float:
+    try:
+        return await page.evaluate(_QUIET_FOR)
+    except Exception:
+        return 0.0
+
+
+async def _wait_ready(page, inflight: _Inflight, budget: float) -> str:
+    """Poll until the strategy's condition holds; `budget` is in seconds."""
+    stop = time.monotonic() + min(budget, READY_MAX_WAIT_MS / 1000)
+    settle_until = time.monotonic() + READY_SETTLE_MS / 1000
+    while True:
+        if await _selector_attached(page):
+            return "selector"
+        if READY_STRATEGY == "settle":
+            if time.monotonic() >= settle_until:
+                return "settle"
+        elif not inflight.pending and await _quiet_for_ms(page) >= READY_QUIET_MS:
+            return "dom_quiet"
+        if time.monotonic() >= stop:
+            return "deadline" if budget * 1000 <= READY_MAX_WAIT_MS else "max_wait"
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def load_page(page, url: str, timeout: float) -> Tuple[str, dict]:
+    """
+    Navigate `page` to `url` and wait until it is ready to read.
+
+    Everything (navigation included) is capped at `timeout` seconds, which
+    the caller derives from the quiz deadline. When the cap is hit, the page
+    is read as it is instead of failing the call. Returns the condition that
+    ended the wait (selector, dom_quiet, settle, networkidle, max_wait or
+    deadline) and the document's response headers.
+    """
+    from playwright.async_api import TimeoutError as PlaywrightTimeout
+
+    started = time.monotonic()
+    response = None
+    if READY_STRATEGY == "networkidle":
+        condition = "networkidle"
+        try:
+            response = await page.goto(url, wait_until="networkidle", timeout=timeout * 1000)
+        except PlaywrightTimeout:
+            condition = "deadline"
+    else:
+        inflight = _Inflight(page)
+        await page.add_init_script(script=_MUTATION_WATCH)
+        try:
+            response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+            condition = await _wait_ready(page, inflight, timeout - (time.monotonic() - started))
+        except PlaywrightTimeout:
+            condition = "deadline"
+
+    READY_CONDITIONS.inc(condition=condition)
+    READY_SECONDS.observe(time.monotonic() - started)
+    print(f"Page ready ({condition}) after {time.monotonic() - started:.2f}s")
+    return condition, (response.headers if response is not None else {})
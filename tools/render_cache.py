@@ -0,0 +1,150 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from metrics import Counter
+from .http_client import get_client
+
+# Rendered pages are reused for RENDER_CACHE_TTL seconds, by every job in the
+# process. After that a page with an ETag or Last-Modified is revalidated
+# with a conditional GET instead of being rendered again.
+RENDER_CACHE_TTL = float(os.getenv("RENDER_CACHE_TTL", "300"))
+# Least recently used pages are evicted past this size (0 disables the cache).
+RENDER_CACHE_MAX_MB = float(os.getenv("RENDER_CACHE_MAX_MB", "64"))
+REVALIDATE_TIMEOUT = 5.0  # seconds; also bounded by the quiz deadline
+
+# Cache-Control directives that forbid reuse without asking the server first.
+_ALWAYS_REVALIDATE = re.compile(r"\bno-cache\b|\bprivate\b|\b(?:s-)?max-age\s*=\s*0+\b", re.I)
+
+RENDER_CACHE_LOOKUPS = Counter("quiz_render_cache_lookups_total", "get_rendered_html render cache lookups, by result.")
+
+
+@dataclass
+class CachedPage:
+    page: Dict[str, Any]
+    size: int
+    stored_at: float = field(default_factory=time.monotonic)
+    # no-cache, private or max-age=0: stale on every lookup, so always revalidated
+    always_revalidate: bool = False
+
+    def fresh(self) -> bool:
+        return not self.always_revalidate and time.monotonic() - self.stored_at < RENDER_CACHE_TTL
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for this page's ETag / Last-Modified."""
+        headers = {}
+        if self.page.get("etag"):
+            headers["If-None-Match"] = self.page["etag"]
+        if self.page.get("last_modified"):
+            headers["If-Modified-Since"] = self.page["last_modified"]
+        return headers
+
+
+class RenderCache:
+    """
+    In-memory TTL + LRU cache of rendered pages, bounded by size.
+
+    Pages are keyed by URL alone: every job fetches with the same shared
+    HTTP client and a fresh browser context (no cookies, same user agent and
+    locale), so no request header tells two renders of a URL apart.
+
+    Concurrent lookups of a page that is still rendering wait for that render
+    (single flight) instead of starting their own, whether they come from the
+    same job or not.
+    """
+
+    def __init__(self, max_bytes: int = int(RENDER_CACHE_MAX_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self.bytes = 0
+        self._lock = threading.Lock()
+        # (loop, key) -> task of the render in progress
+        self._inflight: Dict[Tuple[Any, str], asyncio.Task] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _store(self, key: str, page: Dict[str, Any]):
+        size = len(page["content"].encode()) + len(page["text"].encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self.entries[key] = CachedPage(
+                page, size, always_revalidate=bool(_ALWAYS_REVALIDATE.search(page.get("cache_control") or ""))
+            )
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+
+    async def _revalidate(self, url: str, entry: CachedPage, timeout: float) -> bool:
+        """True if the server answers 304 Not Modified for the cached validators."""
+        try:
+            response = await get_client().get(url, headers=entry.validators(), timeout=timeout)
+        except Exception as e:
+            print(f"Revalidating {url} failed: {e!r}")
+            return False
+        return response.status_code == 304
+
+    async def _fill(self, key: str, render: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        page = await render()
+        if "error" not in page and "no-store" not in (page.get("cache_control") or "").lower():
+            self._store(key, page)
+        return page
+
+    async def get(
+        self,
+        url: str,
+        render: Callable[[], Awaitable[Dict[str, Any]]],
+        timeout: float = REVALIDATE_TIMEOUT,
+        bypass: bool = False,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Return (page, result) for `url`, calling `render()` only when needed.
+
+        `result` is hit, revalidated, joined (waited for a render already in
+        progress), miss or bypass. With `bypass` the cache is not read, but
+        the new render still replaces the stored page.
+        """
+        if not self.enabled:
+            return await render(), "bypass"
+        key = url
+        entry = None if bypass else self.entries.get(key)
+        if entry is not None:
+            if entry.fresh():
+                result = "hit"
+            elif entry.validators() and await self._revalidate(url, entry, timeout):
+                entry.stored_at = time.monotonic()
+                result = "revalidated"
+            else:
+                entry = None
+            if entry is not None:
+                with self._lock:
+                    if key in self.entries:
+                        self.entries.move_to_end(key)
+                RENDER_CACHE_LOOKUPS.inc(result=result)
+                return entry.page, result
+
+        flight_key = (asyncio.get_running_loop(), key)
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            result = "joined"
+        else:
+            result = "bypass" if bypass else "miss"
+            task = self._inflight[flight_key] = asyncio.create_task(self._fill(key, render))
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        RENDER_CACHE_LOOKUPS.inc(result=result)
+        # Shielded: a caller giving up must not cancel the render others wait for
+        return await asyncio.shield(task), result
+
+
+RENDER_CACHE = RenderCache()
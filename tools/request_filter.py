@@ -0,0 +1,77 @@
+import os
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from metrics import Counter
+
+
+def _env_list(name: str, default: str = "") -> tuple:
+    return tuple(item.strip().lower() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+# We only read page.content() and attributes like img src, so these resource
+# types are aborted while rendering. Their URLs are still recorded.
+BLOCK_RESOURCE_TYPES = _env_list("BLOCK_RESOURCE_TYPES", "image,media,font,stylesheet")
+# Requests to these domains (and their subdomains) are always aborted...
+BLOCK_DOMAINS = _env_list(
+    "BLOCK_DOMAINS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,facebook.net,hotjar.com,segment.io",
+)
+# ...and requests to these are never aborted, whatever their resource type.
+ALLOW_DOMAINS = _env_list("ALLOW_DOMAINS")
+# Blocked media URLs reported back to the agent, per page.
+MAX_REPORTED_URLS = 50
+
+BLOCKED_REQUESTS = Counter("quiz_render_blocked_requests_total", "Browser requests aborted while rendering, by reason.")
+
+
+def _matches(host: str, domains) -> bool:
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+def block_reason(url: str, resource_type: str) -> Optional[str]:
+    """Why a browser request should be aborted ("domain" or its resource type), or None."""
+    if resource_type == "document":
+        return None  # never abort the page (or a frame) itself
+    host = (urlsplit(url).hostname or "").lower()
+    if _matches(host, ALLOW_DOMAINS):
+        return None
+    if _matches(host, BLOCK_DOMAINS):
+        return "domain"
+    if resource_type in BLOCK_RESOURCE_TYPES:
+        return resource_type
+    return None
+
+
+class RequestFilter:
+    """
+    Intercepts every request of one browser context and aborts those
+    block_reason() rejects, recording what was blocked.
+    """
+
+    def __init__(self):
+        self.blocked: List[dict] = []
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(BLOCK_RESOURCE_TYPES or BLOCK_DOMAINS)
+
+    async def install(self, context):
+        await context.route("**/*", self._handle)
+
+    async def _handle(self, route, request):
+        reason = block_reason(request.url, request.resource_type)
+        if reason is None:
+            await route.continue_()
+            return
+        self.blocked.append({"url": request.url, "type": request.resource_type, "reason": reason})
+        BLOCKED_REQUESTS.inc(reason=reason)
+        await route.abort("blockedbyclient")
+
+    def media_urls(self) -> List[str]:
+        """Blocked image/audio/video URLs, which the agent may still want to download."""
+        urls = []
+        for item in self.blocked:
+            if item["type"] in ("image", "media") and item["url"] not in urls and not item["url"].startswith("data:"):
+                urls.append(item["url"])
+        return urls[:MAX_REPORTED_URLS]
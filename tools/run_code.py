@@ -1,11 +1,12 @@
-from google import genai
-import subprocess
+import asyncio
 from langchain_core.tools import tool
-from dotenv import load_dotenv
+from langgraph.prebuilt import InjectedState
+from shared_store import get_session
+from deadline import tool_timeout
+from typing import Annotated, Optional
+from .limits import subprocess_slot
 import os
-from google.genai import types
-load_dotenv()
-client = genai.Client()
+import uuid
 
 def strip_code_fences(code: str) -> str:
     code = code.strip()
@@ -17,8 +18,22 @@ def strip_code_fences(code: str) -> str:
         code = code.rsplit("\n", 1)[0]
     return code.strip()
 
+async def communicate(proc, timeout: float):
+    """proc.communicate() that kills the process once `timeout` runs out."""
+    try:
+        return await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        out, err = await proc.communicate()
+        note = f"\nKilled after {timeout:.0f}s: the quiz deadline is close.".encode()
+        return out, err + note
+
 @tool
-def run_code(code: str) -> dict:
+async def run_code(
+    code: str,
+    job_id: Annotated[str, InjectedState("job_id")] = "",
+    deadline: Annotated[Optional[dict], InjectedState("deadline")] = None,
+) -> dict:
     """
     Executes a Python code 
     This tool:
@@ -42,19 +57,26 @@ def run_code(code: str) -> dict:
         }
     """
     try: 
-        filename = "runner.py"
-        os.makedirs("LLMFiles", exist_ok=True)
-        with open(os.path.join("LLMFiles", filename), "w") as f:
+        # Unique per call: several run_code calls from one turn run in parallel
+        filename = f"runner_{uuid.uuid4().hex[:8]}.py"
+        workdir = get_session(job_id).workdir
+        path = os.path.join(workdir, filename)
+        with open(path, "w") as f:
             f.write(code)
 
-        proc = subprocess.Popen(
-            ["uv", "run", filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd="LLMFiles"
-        )
-        stdout, stderr = proc.communicate()
+        try:
+            async with subprocess_slot():
+                proc = await asyncio.create_subprocess_exec(
+                    "uv", "run", filename,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=workdir
+                )
+                out, err = await communicate(proc, tool_timeout(deadline, floor=5.0))
+        finally:
+            os.remove(path)
+        stdout = out.decode(errors="replace")
+        stderr = err.decode(errors="replace")
         if len(stdout) >= 10000:
             return stdout[:10000] + "...truncated due to large size"
         if len(stderr) >= 10000:
@@ -1,16 +1,29 @@
 from langchain_core.tools import tool
-from shared_store import BASE64_STORE, url_time
+from langgraph.prebuilt import InjectedState
+from shared_store import get_session
+from deadline import RETRY_WINDOW, tool_timeout
+from metrics import SUBMISSIONS
+from llm_cache import LLM_CACHE
+import asyncio
 import time
-import os
-import requests
+import httpx
 import json
-from collections import defaultdict
-from typing import Any, Dict, Optional
+from typing import Any, Annotated, Dict, Optional
+from .http_client import get_client
+from .web_scraper import prefetch_page
 
-cache = defaultdict(int)
 retry_limit = 4
+# Late answers still earn the next URL, so a submission is never cut shorter than this.
+MIN_SUBMIT_TIMEOUT = 15.0
+
 @tool
-def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+async def post_request(
+    url: str,
+    payload: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    job_id: Annotated[str, InjectedState("job_id")] = "",
+    deadline: Annotated[Optional[dict], InjectedState("deadline")] = None,
+) -> Any:
     """
     Send an HTTP POST request to the given URL with the provided payload.
 
@@ -29,19 +42,28 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         returned. Otherwise, the raw text response is returned.
 
     Raises:
-        requests.HTTPError: If the server responds with an unsuccessful status.
-        requests.RequestException: For network-related errors.
+        httpx.HTTPStatusError: If the server responds with an unsuccessful status.
+        httpx.HTTPError: For network-related errors.
     """
+    session = get_session(job_id)
+    # Submissions move the session to the next URL, so parallel calls from
+    # one turn are applied one after another.
+    async with session.submit_lock:
+        return await _submit(session, url, payload, headers, tool_timeout(deadline, floor=MIN_SUBMIT_TIMEOUT))
+
+
+async def _submit(session, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]], timeout: float) -> Any:
     # Handling if the answer is a BASE64
     ans = payload.get("answer")
 
     if isinstance(ans, str) and ans.startswith("BASE64_KEY:"):
         key = ans.split(":", 1)[1]
-        payload["answer"] = BASE64_STORE[key]
+        payload["answer"] = session.get_base64(key)
     headers = headers or {"Content-Type": "application/json"}
     try:
-        cur_url = os.getenv("url")
-        cache[cur_url] += 1
+        cur_url = session.url
+        cur_deadline = session.deadline()
+        session.attempts[cur_url] += 1
         sending = payload
         if isinstance(payload.get("answer"), str):
             sending = {
@@ -50,7 +72,7 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
                 "url": payload.get("url", "")
             }
         print(f"\nSending Answer \n{json.dumps(sending, indent=4)}\n to url: {url}")
-        response = requests.post(url, json=payload, headers=headers)
+        response = await get_client().post(url, json=payload, headers=headers, timeout=timeout)
 
         # Raise on 4xx/5xx
         response.raise_for_status()
@@ -59,34 +81,49 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         data = response.json()
         print("Got the response: \n", json.dumps(data, indent=4), '\n')
         
-        delay = time.time() - url_time.get(cur_url, time.time())
+        delay = cur_deadline.elapsed() if cur_deadline else 0.0
         print(delay)
         next_url = data.get("url") 
+        session.last_result = {
+            "url": cur_url,
+            "correct": bool(data.get("correct")),
+            "reason": data.get("reason"),
+            "next_url": next_url,
+            "seconds": round(delay, 2),
+        }
+        session.publish("submission", **session.last_result)
+        SUBMISSIONS.inc(result="correct" if data.get("correct") else "incorrect")
         if not next_url:
             return "Tasks completed"
-        if next_url not in url_time:
-            url_time[next_url] = time.time()
+        prev = session.first_seen(next_url)
 
         correct = data.get("correct")
         if not correct:
+            if LLM_CACHE is not None:
+                # Replaying the replies that led here would submit the same wrong answer
+                evicted = await asyncio.to_thread(LLM_CACHE.evict_url, cur_url)
+                print(f"Evicted {evicted} cached LLM replies for {cur_url}")
             cur_time = time.time()
-            prev = url_time.get(next_url, time.time())
-            if cache[cur_url] >= retry_limit or delay >= 180 or (prev != "0" and (cur_time - float(prev)) > 90): # Shouldn't retry
+            out_of_time = cur_deadline is None or cur_deadline.expired()
+            if session.attempts[cur_url] >= retry_limit or out_of_time or (cur_time - prev) > RETRY_WINDOW: # Shouldn't retry
                 print("Not retrying, moving on to the next question")
                 data = {"url": data.get("url", "")} 
             else: # Retry
-                os.environ["offset"] = str(url_time.get(next_url, time.time()))
+                session.offset = prev
                 print("Retrying..")
                 data["url"] = cur_url
                 data["message"] = "Retry Again!" 
         print("Formatted: \n", json.dumps(data, indent=4), '\n')
         forward_url = data.get("url", "")
-        os.environ["url"] = forward_url 
+        session.url = forward_url 
         if forward_url == next_url:
-            os.environ["offset"] = "0"
+            session.offset = 0.0
+            # The agent will render the next quiz next; start it now
+            deadline = session.deadline()
+            prefetch_page(session, next_url, deadline.to_dict() if deadline else None)
 
         return data
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         # Extract server’s error response
         err_resp = e.response
 
@@ -95,6 +132,7 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         except ValueError:
             err_data = err_resp.text
 
+        SUBMISSIONS.inc(result="http_error")
         print("HTTP Error Response:\n", err_data)
         return err_data
 
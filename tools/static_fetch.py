@@ -0,0 +1,85 @@
+import os
+import re
+from typing import Optional, Tuple
+
+from .http_client import get_client
+
+# Most quiz pages are plain HTML; fetch them over HTTP first and only start
+# Chromium when the markup says JavaScript has to run. 0 always renders.
+STATIC_FAST_PATH = os.getenv("STATIC_FAST_PATH", "1") == "1"
+# Pages with less visible text than this are assumed to be filled in by JS
+# (an extra signal; any external or module script already escalates).
+STATIC_MIN_TEXT_CHARS = int(os.getenv("STATIC_MIN_TEXT_CHARS", "50"))
+STATIC_FETCH_TIMEOUT = 10.0  # seconds; also bounded by the quiz deadline
+
+_SCRIPT = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.S | re.I)
+_INVISIBLE = re.compile(r"<(script|style|template|noscript)\b.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+_TAG = re.compile(r"<[^>]+>")
+# Inline code that can touch the page: any DOM or window access, element
+# property and attribute writes (elements with an id are also globals),
+# DOM methods, jQuery, navigation, network loads and dynamic code. Anything
+# else (plain computation) leaves the markup as is.
+_DOM_ACCESS = re.compile(
+    r"\b(?:document|window|globalThis|self|location|history|jQuery)\b"
+    r"|getElementBy|getElementsBy|querySelector|\$\s*\("
+    r"|\.(?:innerHTML|outerHTML|textContent|innerText|value|href|src|checked|selected|hidden"
+    r"|className|style|dataset)\b[^=;\n]*?(?<![=!<>])=(?!=)"
+    r"|\b(?:setAttribute|removeAttribute|toggleAttribute|classList|appendChild|removeChild|insertBefore"
+    r"|replaceChild|replaceChildren|replaceWith|insertAdjacent\w*|createElement|attachShadow)\b"
+    r"|\.(?:append|prepend|before|after|remove)\s*\("
+    r"|\bfetch\s*\(|XMLHttpRequest|WebSocket|EventSource|\bimport\s*\("
+    r"|\beval\s*\(|\bFunction\s*\(|\bset(?:Timeout|Interval)\s*\(\s*[\"'`]",
+)
+_SCRIPT_SRC = re.compile(r"""\bsrc\s*=""", re.I)
+_MODULE_TYPE = re.compile(r"""\btype\s*=\s*["']?module\b""", re.I)
+# Data blocks (JSON, JSON-LD, templates) never run.
+_DATA_TYPE = re.compile(r"""\btype\s*=\s*["']?[^"'\s>]*(?:json|template)""", re.I)
+# Mount points and markers of client-side rendered apps.
+_SPA_MARKERS = re.compile(
+    r"""id=["'](?:root|app|__next|__nuxt|svelte)["']|__NEXT_DATA__|data-reactroot|ng-version|ng-app|\bx-data\b""",
+    re.I,
+)
+
+
+def js_required(html: str) -> Optional[str]:
+    """Why `html` needs a browser to show its content, or None if the static markup is enough."""
+    if re.search(r"<noscript\b", html, re.I):
+        return "noscript"
+    if _SPA_MARKERS.search(html):
+        return "spa_marker"
+    for attrs, body in _SCRIPT.findall(html):
+        if _DATA_TYPE.search(attrs):
+            continue
+        if _SCRIPT_SRC.search(attrs):
+            # We cannot tell what an external script does without running it
+            return "external_script"
+        if _MODULE_TYPE.search(attrs) or _DOM_ACCESS.search(body):
+            return "script_injected"
+    text = " ".join(_TAG.sub(" ", _INVISIBLE.sub(" ", html)).split())
+    if len(text) < STATIC_MIN_TEXT_CHARS:
+        return "empty_body"
+    return None
+
+
+async def fetch_static(url: str, timeout: float) -> Tuple[Optional[str], Optional[str], dict]:
+    """
+    GET `url` with the pooled HTTP client.
+
+    Returns (html, None, headers) when the page can be used as is, or
+    (None, reason, headers) when it has to be rendered in Chromium instead.
+    """
+    if not url.startswith(("http://", "https://")):
+        return None, "scheme", {}
+    try:
+        response = await get_client().get(url, timeout=timeout)
+    except Exception as e:
+        print(f"Static fetch of {url} failed: {e!r}")
+        return None, "http_error", {}
+    headers = {k.lower(): v for k, v in response.headers.items()}
+    if response.status_code != 200:
+        return None, f"status_{response.status_code}", headers
+    if "html" not in headers.get("content-type", "text/html"):
+        return None, "content_type", headers
+    html = response.text
+    reason = js_required(html)
+    return (None, reason, headers) if reason else (html, None, headers)
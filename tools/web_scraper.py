@@ -1,37 +1,194 @@
 from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from langgraph.prebuilt import InjectedState
+from shared_store import get_session
+from deadline import tool_timeout
+from typing import Annotated, Optional
+from .html_condense import condense_html
+from .limits import browser_slot
+from .browser_pool import browser_context
+from .readiness import load_page
+from .request_filter import RequestFilter
+from .render_cache import RENDER_CACHE, REVALIDATE_TIMEOUT
+from .static_fetch import STATIC_FAST_PATH, STATIC_FETCH_TIMEOUT, fetch_static
+from metrics import Counter
+import asyncio
+import os
 
-@tool
-def get_rendered_html(url: str) -> dict:
+RAW_HTML_CHUNK = 20000
+PAGE_LOAD_TIMEOUT = 60.0  # seconds; also bounded by the quiz deadline
+
+# Start rendering the next quiz page as soon as a submission returns its URL.
+PREFETCH_NEXT_URL = os.getenv("PREFETCH_NEXT_URL", "1") == "1"
+
+RENDER_TIERS = Counter("quiz_render_tier_total", "get_rendered_html calls by serving tier (http or browser) and escalation reason.")
+PREFETCHES = Counter("quiz_page_prefetches_total", "Next-page renders started after a submission, by outcome.")
+
+
+async def _render(url: str, deadline: Optional[dict] = None) -> dict:
     """
-    Fetch and return the fully rendered HTML of a webpage.
+    Fetch or render `url` once. This is the part of a page that does not
+    depend on the job, so the render cache can share it.
+
+    Static pages are served by a plain HTTP GET; pages that need JavaScript
+    (see static_fetch.js_required) are rendered in Chromium.
     """
-    print("\nFetching and rendering:", url)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            page.goto(url, wait_until="networkidle")
-            content = page.content()
-
-            browser.close()
-
-            # Parse images
-            soup = BeautifulSoup(content, "html.parser")
-            imgs = [urljoin(url, img["src"]) for img in soup.find_all("img", src=True)]
-            if len(content) > 300000:
-                    print("Warning: HTML too large, truncating...")
-                    content = content[:300000] + "... [TRUNCATED DUE TO SIZE]"
-            return {
-                "html": content,
-                "images": imgs,
-                "url": url
-            }
+        content, reason, headers = None, "disabled", {}
+        if STATIC_FAST_PATH:
+            timeout = tool_timeout(deadline, floor=2.0, cap=STATIC_FETCH_TIMEOUT)
+            content, reason, headers = await fetch_static(url, timeout)
+
+        request_filter = ready = None
+        if content is not None:
+            tier = "http"
+        else:
+            tier = "browser"
+            async with browser_slot(), browser_context() as context:
+                if RequestFilter.enabled():
+                    request_filter = RequestFilter()
+                    await request_filter.install(context)
+                page = await context.new_page()
+
+                # A page that never settles must not eat the rest of the quiz budget
+                timeout = tool_timeout(deadline, floor=5.0, cap=PAGE_LOAD_TIMEOUT)
+                ready, headers = await load_page(page, url, timeout)
+                content = await page.content()
+        RENDER_TIERS.inc(tier=tier, reason=reason or "static")
+        print(f"Served by the {tier} tier" + (f" ({reason})" if tier == "browser" else ""))
+
+        # Condensing parses the whole DOM, so keep it off the event loop
+        condensed = await asyncio.to_thread(condense_html, content, url)
+        rendered = {
+            "tier": tier,
+            "content": content,
+            "text": condensed["text"],
+            "images": condensed["images"],
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "cache_control": headers.get("cache-control", ""),
+        }
+        if ready:
+            rendered["ready"] = ready
+        if request_filter and request_filter.blocked:
+            # Not downloaded while rendering, but the agent may need them
+            rendered["blocked_requests"] = len(request_filter.blocked)
+            rendered["blocked_media_urls"] = request_filter.media_urls()
+        return rendered
 
     except Exception as e:
         return {"error": f"Error fetching/rendering page: {str(e)}"}
 
 
+async def render_page(url: str, job_id: str, deadline: Optional[dict] = None) -> dict:
+    """
+    Return the condensed page for `url` (the get_rendered_html result).
+
+    Pages come from the process-wide render cache when possible; `tier` says
+    which tier rendered the page and `cache` is set when the call did not
+    render it itself.
+    """
+    print("\nFetching and rendering:", url)
+    session = get_session(job_id)
+    rendered, cached = await RENDER_CACHE.get(
+        url,
+        lambda: _render(url, deadline),
+        timeout=tool_timeout(deadline, floor=1.0, cap=REVALIDATE_TIMEOUT),
+        bypass=session.bypass_cache,
+    )
+    if "error" in rendered:
+        return rendered
+
+    result = {
+        "url": url,
+        "tier": rendered["tier"],
+        "text": rendered["text"],
+        "images": rendered["images"],
+        "raw_html_handle": session.put_raw_html(rendered["content"]),
+        "raw_html_chars": len(rendered["content"])
+    }
+    for key in ("ready", "blocked_requests", "blocked_media_urls"):
+        if key in rendered:
+            result[key] = rendered[key]
+    if cached in ("hit", "revalidated", "joined"):
+        print(f"Render cache: {cached}")
+        result["cache"] = cached
+    return result
+
+
+def prefetch_page(session, url: str, deadline: Optional[dict] = None):
+    """
+    Start rendering `url` in the background; the job's next get_rendered_html
+    call for it picks up the result instead of rendering again.
+    """
+    if not PREFETCH_NEXT_URL or url in session.prefetched:
+        return
+    print("Prefetching next quiz page:", url)
+    PREFETCHES.inc(outcome="started")
+    session.prefetched[url] = asyncio.create_task(render_page(url, session.job_id, deadline))
+
+
+def drop_prefetched(session):
+    """Cancel prefetches the job never asked for (it finished or moved on)."""
+    for task in session.prefetched.values():
+        task.cancel()
+        PREFETCHES.inc(outcome="unused")
+    session.prefetched.clear()
+
+
+@tool
+async def get_rendered_html(
+    url: str,
+    job_id: Annotated[str, InjectedState("job_id")] = "",
+    deadline: Annotated[Optional[dict], InjectedState("deadline")] = None,
+) -> dict:
+    """
+    Render a webpage (JavaScript included) and return its content as compact text.
+
+    The text keeps headings, paragraphs, links as [text](url), images and
+    audio as ![alt](url), forms with their fields, tables as CSV and code
+    blocks. Scripts, styles and navigation are removed. If you need the
+    original markup (e.g. to read a script), pass `raw_html_handle` to the
+    get_raw_html tool.
+    """
+    prefetched = get_session(job_id).prefetched.pop(url, None)
+    if prefetched is not None and not prefetched.cancelled():
+        result = await prefetched
+        if "error" not in result:
+            PREFETCHES.inc(outcome="hit")
+            return result
+        PREFETCHES.inc(outcome="error")
+    return await render_page(url, job_id, deadline)
+
+
+@tool
+def get_raw_html(
+    handle: str,
+    start: int = 0,
+    length: int = RAW_HTML_CHUNK,
+    find: Optional[str] = None,
+    job_id: Annotated[str, InjectedState("job_id")] = "",
+) -> dict:
+    """
+    Return a slice of the raw HTML behind a get_rendered_html result.
+
+    Args:
+        handle (str): The `raw_html_handle` returned by get_rendered_html.
+        start (int): Character offset to start from.
+        length (int): Number of characters to return (max 20000).
+        find (str, optional): If given, the slice starts shortly before the
+            first occurrence of this text at or after `start`.
+
+    Returns:
+        dict: {"html": <slice>, "start": <offset>, "total_chars": <size>}
+    """
+    try:
+        html = get_session(job_id).get_raw_html(handle)
+    except KeyError:
+        return {"error": f"Unknown raw HTML handle: {handle}"}
+    if find:
+        at = html.find(find, start)
+        if at == -1:
+            return {"error": f"'{find}' not found after offset {start}", "total_chars": len(html)}
+        start = max(0, at - 200)
+    length = max(1, min(length, RAW_HTML_CHUNK))
+    return {"html": html[start:start + length], "start": start, "total_chars": len(html)}
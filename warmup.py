@@ -0,0 +1,99 @@
+import asyncio
+import os
+import shutil
+import time
+
+from shared_store import create_session, drop_session
+
+WARMUP_LLM = os.getenv("WARMUP_LLM", "1") != "0"
+SMOKE_PAGE = "data:text/html,<html><body><h1>warmup</h1><img src='x.png'></body></html>"
+# The instance is not ready until these steps pass; each gets this many tries.
+REQUIRED_STEPS = ("browser", "run_code")
+REQUIRED_ATTEMPTS = 3
+RETRY_DELAY = 2.0  # seconds, doubled after each failed try
+
+# Filled in by warm_up(); served by /readyz.
+STATUS = {"ready": False, "steps": {}, "errors": {}}
+
+
+async def _step(name: str, func, *args) -> bool:
+    """Run a warm-up step (retried if it is required); True if it passed."""
+    started = time.perf_counter()
+    attempts = REQUIRED_ATTEMPTS if name in REQUIRED_STEPS else 1
+    ok = False
+    for attempt in range(attempts):
+        if attempt:
+            await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            await func(*args)
+        except Exception as e:
+            STATUS["errors"][name] = str(e)
+            print(f"Warm-up step '{name}' failed (try {attempt + 1}/{attempts}): {e}")
+            continue
+        STATUS["errors"].pop(name, None)
+        ok = True
+        break
+    STATUS["steps"][name] = round(time.perf_counter() - started, 3)
+    return ok
+
+
+async def _preload_imports():
+    import tools
+    await asyncio.to_thread(tools.preload)
+
+
+async def _smoke_render(job_id: str):
+    from tools import get_rendered_html
+    result = await get_rendered_html.ainvoke({"url": SMOKE_PAGE, "job_id": job_id})
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+
+async def _smoke_run_code(job_id: str):
+    from tools import run_code
+    result = await run_code.ainvoke({"code": "print('ok')", "job_id": job_id})
+    if not isinstance(result, dict) or result.get("return_code") != 0:
+        raise RuntimeError(f"uv run smoke test failed: {result}")
+
+
+async def _smoke_llm():
+    from agent import fast_llm, strong_llm
+    from llm_cache import CACHE_BYPASS
+    # A cached reply would never open the Gemini connection
+    token = CACHE_BYPASS.set(True)
+    try:
+        models = [fast_llm] if fast_llm is strong_llm else [fast_llm, strong_llm]
+        await asyncio.gather(*(m.ainvoke("Reply with the single word: ready") for m in models))
+    finally:
+        CACHE_BYPASS.reset(token)
+
+
+async def warm_up():
+    """
+    Pay the cold-start costs before the first real quiz does.
+
+    Imports the lazily-loaded tool dependencies, launches the shared
+    Chromium, lets `uv run` resolve its environment and
+    (unless WARMUP_LLM=0) opens the Gemini connection of both cascade
+    models with a one-word prompt, by running a synthetic job through the
+    same tools the agent uses.
+
+    The instance only becomes ready once the browser and run_code steps
+    pass; an import or LLM failure is reported but does not block it.
+    """
+    started = time.perf_counter()
+    session = create_session("warmup")
+    try:
+        await _step("imports", _preload_imports)
+        required = [
+            await _step("browser", _smoke_render, session.job_id),
+            await _step("run_code", _smoke_run_code, session.job_id),
+        ]
+        if WARMUP_LLM:
+            await _step("llm", _smoke_llm)
+    finally:
+        drop_session(session.job_id)
+        shutil.rmtree(os.path.join("LLMFiles", session.job_id), ignore_errors=True)
+    STATUS["steps"]["total"] = round(time.perf_counter() - started, 3)
+    STATUS["ready"] = all(required)
+    print(f"Warm-up finished in {STATUS['steps']['total']}s (ready={STATUS['ready']}): {STATUS['steps']}")